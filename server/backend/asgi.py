@@ -13,4 +13,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
+# Serve this app with an ASGI server (e.g. gunicorn -k uvicorn.workers.UvicornWorker
+# backend.asgi:application) so long-lived streams such as the upload progress
+# events run on the event loop instead of holding a worker thread each.
 application = get_asgi_application()
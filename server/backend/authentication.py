@@ -13,7 +13,7 @@ class JWTAuthentication(BaseAuthentication):
   
         user = decode_token(token)
         print(user)
-        if not user:
+        if user is None:
             return None
 
         return (user, None)  # DRF sets request.user = user
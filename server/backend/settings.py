@@ -7,6 +7,7 @@ No Djongo required.
 
 from pathlib import Path
 from mongoengine import connect
+from celery.schedules import crontab
 import os
 from dotenv import load_dotenv
 
@@ -150,3 +151,25 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Asia/Kolkata"
+# Task modules are named task.py, which autodiscovery does not pick up
+CELERY_IMPORTS = ("books.task", "borrow.task")
+# Periodic jobs (run a beat process: celery -A backend beat)
+CELERY_BEAT_SCHEDULE = {
+    # Returned records older than BORROW_ARCHIVE_AFTER_DAYS -> monthly archive collections
+    "archive-borrow-records": {
+        "task": "borrow.task.archive_borrow_records",
+        "schedule": crontab(hour=2, minute=30),
+    },
+    # Accrued fines of overdue active loans -> BorrowRecord.fine
+    "materialize-borrow-fines": {
+        "task": "borrow.task.materialize_borrow_fines",
+        "schedule": crontab(hour=0, minute=15),
+    },
+}
+
+# ------------------------------
+# BULK UPLOAD SPOOL
+# ------------------------------
+# Uploaded CSVs are streamed to disk here and Celery only receives the path,
+# so web and worker processes must share this directory.
+BULK_UPLOAD_SPOOL_DIR = os.getenv("BULK_UPLOAD_SPOOL_DIR", os.path.join(BASE_DIR, "spool"))
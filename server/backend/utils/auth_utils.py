@@ -1,21 +1,35 @@
 # backend/utils/auth_utils.py
+import os
 import jwt
+import redis
 from datetime import datetime, timedelta
+from django.utils.functional import SimpleLazyObject
 from users.models import User
 from bson import ObjectId
+from pymongo import ReturnDocument
 from mongoengine.errors import ValidationError
+from backend.utils.principal_cache import principal_cache
+from backend.utils.redis_client import redis_client
 SECRET_KEY = "YOUR_SECRET_KEY"  # use env variable in production
 ALGORITHM = "HS256"
 
+# When enabled, access tokens carry role/username/token-version claims and
+# decode_token authorizes from the claims without a User lookup.
+STATELESS_AUTH = os.getenv("STATELESS_AUTH", "False").lower() == "true"
+
 # ----------------------
 # Token Generation
 # ----------------------
-def generate_access_token(user_id, exp_hours=1):
+def generate_access_token(user_id, exp_hours=1, role=None, username=None):
     payload = {
         "user_id": str(user_id),
         "exp": datetime.utcnow() + timedelta(hours=exp_hours),
         "type": "access"
     }
+    if STATELESS_AUTH and role:
+        version = current_token_version(user_id)
+        if version is not None:
+            payload.update({"role": role, "username": username, "ver": version})
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 def generate_refresh_token(user_id, exp_days=7):
@@ -26,6 +40,86 @@ def generate_refresh_token(user_id, exp_days=7):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
+# ----------------------
+# Token Revocation
+# ----------------------
+def current_token_version(user_id):
+    """
+    The user's token version: from Redis, or, when Redis does not know it
+    (key lost or Redis down), from User.token_version, re-seeding Redis.
+    None when the user no longer exists.
+    """
+    try:
+        version = redis_client.get_token_version(user_id)
+    except redis.RedisError:
+        version = None
+    if version is not None:
+        return version
+
+    row = User._get_collection().find_one({"_id": ObjectId(user_id)}, {"token_version": 1})
+    if row is None:
+        return None
+    version = row.get("token_version") or 0
+    try:
+        redis_client.seed_token_version(user_id, version)
+    except redis.RedisError:
+        pass
+    return version
+
+
+def revoke_user_tokens(user_id):
+    """
+    Invalidate every stateless access token issued to a user so far
+    and drop the user from the in-process principal cache.
+    The new version is stored on the User first, so losing the Redis copy
+    can never bring revoked tokens back.
+    """
+    row = User._get_collection().find_one_and_update(
+        {"_id": ObjectId(user_id)}, {"$inc": {"token_version": 1}},
+        projection={"token_version": 1}, return_document=ReturnDocument.AFTER,
+    )
+    principal_cache.invalidate(user_id)
+    try:
+        if row is None:
+            redis_client.clear_token_version(user_id)  # deleted user: the DB lookup rejects the tokens
+        else:
+            redis_client.set_token_version(user_id, row["token_version"])
+    except redis.RedisError:
+        pass
+
+# ----------------------
+# Lazy Principal
+# ----------------------
+def _load_user(user_id):
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = User.objects.get(id=ObjectId(user_id))
+        principal_cache.set(user_id, user)
+    return user
+
+
+class LazyUser(SimpleLazyObject):
+    """
+    Principal built from access-token claims.
+    id, pk, role and username come from the token; touching any other
+    attribute loads the full User document once and proxies to it.
+    """
+    _claim_fields = ("id", "pk", "role", "username")
+
+    def __init__(self, user_id, role, username):
+        super().__init__(lambda: _load_user(user_id))
+        self.__dict__.update(
+            id=ObjectId(user_id),
+            pk=ObjectId(user_id),
+            role=role,
+            username=username,
+        )
+
+    def __setattr__(self, name, value):
+        if name in self._claim_fields:
+            self.__dict__[name] = value
+        super().__setattr__(name, value)
+
 # ----------------------
 # Token Decoding
 # ----------------------
@@ -36,8 +130,22 @@ def decode_token(token):
         if not user_id:
             return None
 
+        # Stateless tokens are authorized from their claims, provided the
+        # token version still matches the user's current version (Redis,
+        # or the User document when Redis does not have it)
+        if STATELESS_AUTH and payload.get("role"):
+            if payload.get("ver") != current_token_version(user_id):
+                return None
+            return LazyUser(user_id, payload["role"], payload.get("username"))
+
+        # Serve repeat requests from the in-process principal cache
+        user = principal_cache.get(user_id)
+        if user is not None:
+            return user
+
         # Convert user_id to ObjectId for MongoEngine
         user = User.objects.get(id=ObjectId(user_id))
+        principal_cache.set(user_id, user)
         return user
     except (User.DoesNotExist, ValidationError, jwt.ExpiredSignatureError, jwt.DecodeError):
         return None
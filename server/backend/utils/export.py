@@ -0,0 +1,106 @@
+# backend/utils/export.py
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from bson import ObjectId
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2000))  # documents per cursor round trip
+FLUSH_BYTES = 64 * 1024  # encoded output is yielded in blocks of about this size
+
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (ObjectId, datetime)):
+        return _json_default(value)
+    if isinstance(value, list):
+        return ";".join(_csv_cell(v) for v in value)
+    return value
+
+
+def iter_export(collection, fields, query=None, fmt="csv", batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield an export of `collection` as encoded blocks.
+
+    Documents come from one pymongo cursor over the _id index, projected to
+    `fields` and fetched batch_size at a time, so memory use depends on the
+    batch size and not on how many documents are exported.
+    """
+    cursor = collection.find(
+        query or {}, {field: 1 for field in fields},
+        sort=[("_id", 1)], batch_size=batch_size,
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    try:
+        if writer:
+            writer.writerow(["id", *fields])
+        for doc in cursor:
+            if writer:
+                writer.writerow([str(doc["_id"]), *(_csv_cell(doc.get(f)) for f in fields)])
+            else:
+                row = {"id": doc["_id"], **{f: doc.get(f) for f in fields}}
+                buffer.write(json.dumps(row, default=_json_default, separators=(",", ":")))
+                buffer.write("\n")
+            if buffer.tell() >= FLUSH_BYTES:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        cursor.close()
+
+
+def gzip_stream(blocks, level=6):
+    """Compress a stream of byte blocks into a gzip stream without buffering it."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(collection, fields, filename, query=None, fmt="csv", gzip=False):
+    """
+    StreamingHttpResponse for an export download.
+    Raises ValueError for an unknown format.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    body = iter_export(collection, fields, query, fmt)
+    filename = f"{filename}.{fmt}"
+    content_type = CONTENT_TYPES[fmt]
+    if gzip:
+        body = gzip_stream(body)
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+def export_options(request):
+    """(format, gzip) from ?format=csv|ndjson&gzip=1"""
+    fmt = request.GET.get("format", "csv").lower()
+    gzip = request.GET.get("gzip", "").lower() in ("1", "true", "yes")
+    return fmt, gzip
@@ -6,3 +6,16 @@ def to_dict(document):
 
 def to_dict_list(documents):
     return [to_dict(doc) for doc in documents]
+
+def lean(queryset, *fields):
+    """
+    Lean read path: project to `fields` and iterate raw pymongo dicts,
+    skipping Document instantiation entirely.
+    """
+    return queryset.only(*fields).as_pymongo()
+
+def raw_to_dict(raw):
+    """Convert a raw pymongo dict (from lean()) to a JSON-ready dict"""
+    data = dict(raw)
+    data["id"] = str(data.pop("_id"))
+    return data
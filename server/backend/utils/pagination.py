@@ -1,3 +1,12 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+
+COUNT_MODES = ("exact", "estimated", "none")
+ESTIMATED_COUNT_CAP = 10000  # filtered "estimated" counts stop here
+
+
 def paginate(queryset, page, limit):
     page = max(int(page), 1)
     limit = max(int(limit), 1)
@@ -11,3 +20,187 @@ def paginate(queryset, page, limit):
         "total": total,
         "pages": (total + limit - 1) // limit
     }
+
+
+# ----------------------
+# Keyset (seek) pagination
+# ----------------------
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+    return value
+
+
+def encode_cursor(values, direction="next"):
+    """Encode the sort-key values of a boundary row into an opaque cursor."""
+    raw = json.dumps({"v": [_encode_value(v) for v in values], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (values, direction) for a cursor; raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(v) for v in data["v"]]
+        direction = data.get("d", "next")
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if direction not in ("next", "prev"):
+        raise ValueError("Invalid cursor")
+    return values, direction
+
+
+def parse_sort(sort):
+    """
+    "-created_at,id" or ("-created_at", "id") -> [(field, db_field, order), ...]
+    The last field must be unique (normally id) so every row has a distinct key.
+    """
+    if isinstance(sort, str):
+        sort = sort.split(",")
+    spec = []
+    for key in sort:
+        key = key.strip()
+        order = -1 if key.startswith("-") else 1
+        field = key.lstrip("-+")
+        db_field = "_id" if field in ("id", "pk", "_id") else field
+        spec.append((field, db_field, order))
+    return spec
+
+
+def keyset_filter(sort, values, backward=False):
+    """
+    Raw filter selecting the rows strictly after `values` in `sort` order
+    (or strictly before them when paging backward).
+    """
+    spec = parse_sort(sort)
+    if len(values) != len(spec):
+        raise ValueError("Invalid cursor")
+    clauses = []
+    for i, (_, db_field, order) in enumerate(spec):
+        op = "$lt" if (order < 0) != backward else "$gt"
+        clause = {spec[j][1]: values[j] for j in range(i)}
+        clause[db_field] = {op: values[i]}
+        clauses.append(clause)
+    return {"$or": clauses} if len(clauses) > 1 else clauses[0]
+
+
+def keyset_sort(sort, backward=False):
+    """Sort spec as a raw {db_field: 1|-1} dict, reversed when paging backward."""
+    return {db_field: -order if backward else order for _, db_field, order in parse_sort(sort)}
+
+
+def sort_values(item, sort):
+    """Sort-key values of a row; works for documents and as_pymongo() dicts."""
+    if isinstance(item, dict):
+        return [item.get(db_field) for _, db_field, _ in parse_sort(sort)]
+    return [getattr(item, field) for field, _, _ in parse_sort(sort)]
+
+
+def cursor_from_item(item, sort, direction="next"):
+    return encode_cursor(sort_values(item, sort), direction)
+
+
+def count_queryset(queryset, mode):
+    """
+    exact     - count() on the filtered queryset
+    estimated - collection metadata when unfiltered, otherwise a count capped
+                at ESTIMATED_COUNT_CAP
+    none      - no count at all
+    """
+    if mode == "exact":
+        return queryset.count()
+    if mode == "estimated":
+        collection = queryset._collection
+        query = queryset._query
+        if not query:
+            return collection.estimated_document_count()
+        return collection.count_documents(query, limit=ESTIMATED_COUNT_CAP)
+    return None
+
+
+def keyset_paginate(queryset, sort, limit, cursor=None, count_mode="none", page=None):
+    """
+    Seek-based pagination: each page is a range scan on the sort index starting
+    at the cursor, so page N costs the same as page 1.
+
+    - sort:       e.g. "-created_at,id"; an index on the same fields is expected
+    - cursor:     opaque value from a previous page's next_cursor / prev_cursor
+    - count_mode: "exact", "estimated" or "none"
+    - page:       legacy page number, only used when no cursor is given (skips rows)
+    """
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"count must be one of {', '.join(COUNT_MODES)}")
+    limit = max(int(limit), 1)
+
+    values, direction = decode_cursor(cursor) if cursor else (None, "next")
+    backward = direction == "prev"
+
+    qs = queryset.order_by(*[
+        ("-" if (order < 0) != backward else "") + field
+        for field, _, order in parse_sort(sort)
+    ])
+    if values is not None:
+        qs = qs.filter(__raw__=keyset_filter(sort, values, backward))
+    elif page and int(page) > 1:
+        qs = qs.skip((int(page) - 1) * limit)
+
+    rows = list(qs.limit(limit + 1))
+    result = keyset_result(rows, sort, limit, values, backward, page)
+    if count_mode != "none":
+        result["total"] = count_queryset(queryset, count_mode)
+    return result
+
+
+def keyset_aggregate(collection, match, sort, limit, cursor=None, stages=(), page=None):
+    """
+    keyset_paginate for aggregation pipelines:
+    $match -> keyset $match -> $sort -> $limit run on the sort index, then
+    `stages` (e.g. $lookup / $project) applied to the page rows only, all in
+    one round trip. `stages` must keep the sort fields in the output.
+    """
+    limit = max(int(limit), 1)
+    values, direction = decode_cursor(cursor) if cursor else (None, "next")
+    backward = direction == "prev"
+
+    pipeline = [{"$match": match}]
+    if values is not None:
+        pipeline.append({"$match": keyset_filter(sort, values, backward)})
+    pipeline.append({"$sort": keyset_sort(sort, backward)})
+    if values is None and page and int(page) > 1:
+        pipeline.append({"$skip": (int(page) - 1) * limit})
+    pipeline.append({"$limit": limit + 1})
+    pipeline.extend(stages)
+
+    return keyset_result(list(collection.aggregate(pipeline)), sort, limit, values, backward, page)
+
+
+def keyset_result(rows, sort, limit, values, backward, page):
+    """Trim the limit + 1 rows of a keyset query and build the page/cursor dict."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+
+    has_next = has_more if not backward else True
+    has_prev = has_more if backward else (values is not None or bool(page and int(page) > 1))
+
+    return {
+        "items": rows,
+        "limit": limit,
+        "has_next": has_next and bool(rows),
+        "has_prev": has_prev and bool(rows),
+        "next_cursor": cursor_from_item(rows[-1], sort, "next") if rows and has_next else None,
+        "prev_cursor": cursor_from_item(rows[0], sort, "prev") if rows and has_prev else None,
+    }
@@ -1,18 +1,32 @@
 from functools import wraps
+from asgiref.sync import iscoroutinefunction
 from django.http import JsonResponse
 
+def _check_role(request, roles):
+    """Return an error response when the request may not proceed, else None."""
+    if getattr(request, "user", None) is None:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    if request.user.role not in roles:
+        return JsonResponse({"error": "Permission denied"}, status=403)
+    return None
+
 def require_role(*roles):
-    """Decorator to enforce user roles on a view"""
+    """Decorator to enforce user roles on a view (sync or async)"""
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _async_wrapped(request, *args, **kwargs):
+                denied = _check_role(request, roles)
+                if denied is not None:
+                    return denied
+                return await view_func(request, *args, **kwargs)
+            return _async_wrapped
+
         @wraps(view_func)
         def _wrapped(request, *args, **kwargs):
-            print("entered")
-            if not getattr(request, "user", None):
-                return JsonResponse({"error": "Authentication required"}, status=401)
-            if request.user.role not in roles:
-                print("swanith")
-                return JsonResponse({"error": "Permission denied"}, status=403)
-            print("success")
+            denied = _check_role(request, roles)
+            if denied is not None:
+                return denied
             return view_func(request, *args, **kwargs)
         return _wrapped
     return decorator
@@ -0,0 +1,82 @@
+# backend/utils/principal_cache.py
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 1024))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
+
+class PrincipalCache:
+    """
+    Bounded LRU + TTL cache of authenticated User documents, keyed by user id.
+    Saves the User lookup that decode_token would otherwise do on every request.
+    The cache is per process, so the TTL bounds how long other workers can
+    serve a stale principal after invalidate() is called in this one.
+
+    Entries are stored as a snapshot of the document's data and every get()
+    builds a fresh Document from it, so a request that modifies its user
+    (and then fails to save) cannot leak the change to other requests.
+    """
+
+    def __init__(self, max_size=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            document, son, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return document._from_son(copy.deepcopy(son))
+
+    def set(self, user_id, user):
+        if self.max_size <= 0:
+            return
+        key = str(user_id)
+        son = copy.deepcopy(user.to_mongo().to_dict())
+        with self._lock:
+            self._entries[key] = (type(user), son, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Global instance
+principal_cache = PrincipalCache()
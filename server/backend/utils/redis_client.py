@@ -1,9 +1,21 @@
 # backend/utils/redis_client.py
 import os
+import time
 import redis
 import json
 
 REDIS_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+UPLOAD_PROGRESS_TTL = int(os.getenv("UPLOAD_PROGRESS_TTL", 24 * 60 * 60))  # abandoned jobs expire
+# An upload with no heartbeat for this long is considered dead and may be resumed;
+# a failed one only needs its other shards to have gone quiet for UPLOAD_FAILED_GRACE
+UPLOAD_STALL_SECONDS = int(os.getenv("UPLOAD_STALL_SECONDS", 15 * 60))
+UPLOAD_FAILED_GRACE = int(os.getenv("UPLOAD_FAILED_GRACE", 60))
+
+
+def upload_channel(task_id):
+    """Pub/sub channel notified whenever an upload job's hash changes."""
+    return f"upload:{task_id}:events"
+
 
 class RedisClient:
     def __init__(self, url=REDIS_URL):
@@ -28,5 +40,72 @@ class RedisClient:
     def hgetall(self, key):
         return self.r.hgetall(key)
 
+    # Upload job hashes: every write refreshes the TTL and the heartbeat and
+    # notifies stream subscribers
+    def update_upload(self, task_id, mapping):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hset(task_id, mapping={**mapping, "heartbeat": time.time()})
+        pipe.expire(task_id, UPLOAD_PROGRESS_TTL)
+        pipe.publish(upload_channel(task_id), "updated")
+        pipe.execute()
+
+    # Pipelined counters for sharded bulk uploads: every increment is applied
+    # to the job total and to the shard's own field, together with the shard's
+    # checkpoint fields, in one MULTI/EXEC round trip (once per chunk, never per row)
+    def incr_upload_progress(self, task_id, shard, increments, fields=None):
+        pipe = self.r.pipeline(transaction=True)
+        for name, amount in increments.items():
+            pipe.hincrby(task_id, name, amount)
+            pipe.hincrby(task_id, f"shard:{shard}:{name}", amount)
+        pipe.hset(task_id, mapping={
+            **{f"shard:{shard}:{k}": v for k, v in (fields or {}).items()},
+            "heartbeat": time.time(),
+        })
+        pipe.expire(task_id, UPLOAD_PROGRESS_TTL)
+        pipe.publish(upload_channel(task_id), "updated")
+        pipe.execute()
+
+    def claim_upload_resume(self, task_id):
+        """
+        Move an upload to "resuming" if it has failed or stalled. The check and
+        the transition run under WATCH, so of two concurrent resume requests
+        (or a resume racing a live shard's heartbeat) at most one wins.
+        Returns the job's status when the claim is refused, None when it succeeded.
+        """
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(task_id)
+                status, heartbeat = pipe.hmget(task_id, "status", "heartbeat")
+                status = status.decode() if status else None
+                if status is None or status == "completed":
+                    return status or "missing"
+                quiet = time.time() - float(heartbeat or 0)
+                if quiet < (UPLOAD_FAILED_GRACE if status == "failed" else UPLOAD_STALL_SECONDS):
+                    return status
+                pipe.multi()
+                pipe.hset(task_id, mapping={"status": "resuming", "heartbeat": time.time()})
+                pipe.publish(upload_channel(task_id), "updated")
+                pipe.execute()
+                return None
+            except redis.WatchError:
+                return "resuming"
+
+    # Per-user access token version, a copy of User.token_version (bumped to
+    # revoke stateless tokens). None means unknown: the key was never seeded,
+    # or was lost to a flush / eviction / failover, so callers must ask the DB.
+    def get_token_version(self, user_id):
+        raw = self.r.get(f"auth:token_version:{user_id}")
+        return int(raw) if raw is not None else None
+
+    def seed_token_version(self, user_id, version):
+        # NX: never overwrite a newer value written by set_token_version
+        self.r.set(f"auth:token_version:{user_id}", version, nx=True)
+
+    def set_token_version(self, user_id, version):
+        self.r.set(f"auth:token_version:{user_id}", version)
+
+    def clear_token_version(self, user_id):
+        self.r.delete(f"auth:token_version:{user_id}")
+
 # Global instance
 redis_client = RedisClient()
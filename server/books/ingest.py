@@ -0,0 +1,398 @@
+# books/ingest.py
+import csv
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from books.models import Book, BookCopy, DUPLICATE_KEY_ERROR
+
+CHUNK_SIZE = int(os.getenv("BULK_UPLOAD_CHUNK_SIZE", 1000))
+SHARD_BYTES = int(os.getenv("BULK_UPLOAD_SHARD_BYTES", 8 * 1024 * 1024))
+MAX_SHARDS = int(os.getenv("BULK_UPLOAD_MAX_SHARDS", 8))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+# Integer columns and their accepted (min, max); None leaves that side open.
+# Shared with books.validation so the pre-check and the ingester agree.
+INTEGER_PATTERN = r"[+-]?\d+"
+NUMERIC_RANGES = {
+    "published_year": (1, datetime.utcnow().year + 1),
+    "price": (0, None),
+    "no_of_pages": (1, None),
+}
+
+
+# -----------------------------------
+# Upload spooling
+# -----------------------------------
+def spool_path(task_id):
+    return os.path.join(settings.BULK_UPLOAD_SPOOL_DIR, f"{task_id}.csv")
+
+
+def errors_path(task_id, shard=None):
+    """Failed rows with their reason; one file per shard, merged when the job completes."""
+    suffix = f".shard{shard}" if shard is not None else ""
+    return os.path.join(settings.BULK_UPLOAD_SPOOL_DIR, f"{task_id}{suffix}.errors.csv")
+
+
+def merge_error_files(task_id, shards):
+    """
+    Concatenate the per-shard error files into one CSV (header written once)
+    and remove them. Returns the merged path, or None when nothing failed.
+    """
+    merged_path, wrote_header, wrote_rows = errors_path(task_id), False, False
+    with open(merged_path, "wb") as merged:
+        for shard in range(shards):
+            path = errors_path(task_id, shard)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as part:
+                header = part.readline()
+                if header and not wrote_header:
+                    merged.write(header)
+                    wrote_header = True
+                for block in iter(lambda: part.read(SPOOL_CHUNK_BYTES), b""):
+                    merged.write(block)
+                    wrote_rows = True
+            os.remove(path)
+    if not wrote_rows:
+        os.remove(merged_path)
+        return None
+    return merged_path
+
+
+def spool_upload(uploaded_file, task_id):
+    """
+    Stream an uploaded file to the spool directory in fixed-size chunks,
+    so request memory stays constant whatever the file size.
+    """
+    os.makedirs(settings.BULK_UPLOAD_SPOOL_DIR, exist_ok=True)
+    path = spool_path(task_id)
+    with open(path, "wb") as out:
+        for chunk in uploaded_file.chunks(SPOOL_CHUNK_BYTES):
+            out.write(chunk)
+    return path
+
+
+# -----------------------------------
+# Sharding
+# -----------------------------------
+def plan_shards(path, shard_bytes=SHARD_BYTES, max_shards=MAX_SHARDS):
+    """
+    Split the data rows of a spooled CSV into byte ranges that start on line
+    boundaries, one per shard task. Returns [(start, end), ...].
+    Assumes one record per line (no newlines inside quoted fields).
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()  # header
+        data_start = f.tell()
+        data_size = size - data_start
+        count = max(1, min(max_shards, -(-data_size // shard_bytes)))
+
+        bounds = [data_start]
+        for i in range(1, count):
+            f.seek(data_start + data_size * i // count)
+            f.readline()  # move to the start of the next line
+            bounds.append(max(f.tell(), bounds[-1]))
+        bounds.append(size)
+
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    return ranges or [(data_start, size)]
+
+
+def iter_range_lines(f, start, end):
+    """Yield the lines of a binary file that start inside [start, end)."""
+    f.seek(start)
+    position = start
+    while position < end:
+        line = f.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line
+
+
+# -----------------------------------
+# Row parsing (no database work)
+# -----------------------------------
+def _int(row, column, default=None):
+    value = (row.get(column) or "").strip()
+    if not value:
+        return default
+    # Same rule as books.validation; int() alone would also accept "1_000"
+    if not re.fullmatch(INTEGER_PATTERN, value):
+        raise ValueError(f"{column} is not an integer")
+    number = int(value)
+    low, high = NUMERIC_RANGES[column]
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ValueError(f"{column} out of range")
+    return number
+
+
+def parse_row(row):
+    """
+    CSV row -> ((title, author), Book document, barcode).
+    Raises ValueError for malformed rows, before anything is written.
+    """
+    title = (row.get("title") or "").strip()
+    author = (row.get("author") or "").strip()
+    if not title or not author:
+        raise ValueError("title and author are required")
+
+    book = {
+        "title": title,
+        "author": author,
+        "category": row.get("category"),
+        "edition": row.get("edition") or "1st",
+        "publisher": row.get("publisher"),
+        "published_year": _int(row, "published_year"),
+        "price": _int(row, "price", 0),
+        "location": row.get("location"),
+        "isbn": row.get("isbn"),
+        "language": row.get("language") or "English",
+        "no_of_pages": _int(row, "no_of_pages"),
+        "cover_image_url": row.get("cover_image_url"),
+        "ebook_url": row.get("ebook_url"),
+        "total_copies": 0,
+        "available_copies": 0,
+        "waitlist": [],
+        "related_books": [],
+        "created_at": datetime.utcnow(),
+    }
+    book = {k: v for k, v in book.items() if v not in (None, "")}
+    barcode = (row.get("barcode") or "").strip() or None
+    return (title, author), book, barcode
+
+
+# -----------------------------------
+# Chunk ingestion
+# -----------------------------------
+def resolve_books(books_by_key):
+    """
+    Map (title, author) -> Book _id for one chunk:
+    one prefetch, plus one bulk upsert and re-read for books that do not exist yet.
+    Shards normally find every book already created by resolve_file_books.
+    """
+    collection = Book._get_collection()
+
+    def lookup(keys):
+        query = {"$or": [{"title": t, "author": a} for t, a in keys]}
+        return {(d["title"], d["author"]): d["_id"] for d in collection.find(query, {"title": 1, "author": 1})}
+
+    ids = lookup(books_by_key.keys())
+    missing = [key for key in books_by_key if key not in ids]
+    if missing:
+        collection.bulk_write([
+            UpdateOne({"title": t, "author": a}, {"$setOnInsert": books_by_key[(t, a)]}, upsert=True)
+            for t, a in missing
+        ], ordered=False)
+        ids.update(lookup(missing))
+    return ids
+
+
+def ingest_chunk(rows, chunk_key=None):
+    """
+    Write one chunk of CSV rows:
+    - books resolved through an in-memory title/author map (see resolve_books)
+    - copies upserted by barcode in one unordered bulk_write, so replaying a
+      chunk after a crash writes nothing twice
+    - Book counters bumped once per book with an aggregated $inc, for new copies only
+
+    With a chunk_key (stable across replays of the same chunk) copies are
+    stamped with it, and a replay counts the copies it inserted on an earlier
+    attempt as well. The $inc only applies to books that do not list the key
+    in ingest_chunks yet and adds it in the same update, so a crash between
+    the copy upsert and the counter update can neither lose nor repeat it.
+    Returns {"processed", "failed", "errors": [(row, reason), ...]}.
+    """
+    parsed, errors = [], []
+    for row in rows:
+        try:
+            parsed.append((row, *parse_row(row)))
+        except (ValueError, TypeError) as e:
+            errors.append((row, str(e)))
+
+    if parsed:
+        books_by_key = {}
+        for _, key, book, _ in parsed:
+            books_by_key.setdefault(key, book)
+        book_ids = resolve_books(books_by_key)
+
+        now = datetime.utcnow()
+        copies, copy_rows, seen = [], [], set()
+        for row, key, _, barcode in parsed:
+            if barcode in seen:
+                errors.append((row, "Duplicate barcode in file"))
+            elif barcode:
+                seen.add(barcode)
+                copies.append({
+                    "book": book_ids[key],
+                    "barcode": barcode,
+                    "is_available": True,
+                    "is_damaged": False,
+                    "condition": "Good",
+                    "added_at": now,
+                    **({"ingest_key": chunk_key} if chunk_key else {}),
+                })
+                copy_rows.append((row, key))
+
+        rejected, upserted = {}, set()
+        if copies:
+            collection = BookCopy._get_collection()
+            try:
+                result = collection.bulk_write([
+                    UpdateOne({"barcode": copy["barcode"]}, {"$setOnInsert": copy}, upsert=True)
+                    for copy in copies
+                ], ordered=False)
+                upserted = set(result.upserted_ids)
+            except BulkWriteError as e:
+                upserted = {u["index"] for u in e.details.get("upserted", [])}
+                for err in e.details.get("writeErrors", []):
+                    rejected[err["index"]] = (
+                        "Duplicate barcode" if err.get("code") == DUPLICATE_KEY_ERROR else err.get("errmsg")
+                    )
+
+            # A barcode that already existed for the same book was written by an
+            # earlier run of this import; for any other book it is a real duplicate
+            matched = [i for i in range(len(copies)) if i not in upserted and i not in rejected]
+            if matched:
+                existing = {
+                    d["barcode"]: d
+                    for d in collection.find(
+                        {"barcode": {"$in": [copies[i]["barcode"] for i in matched]}},
+                        {"barcode": 1, "book": 1, "ingest_key": 1},
+                    )
+                }
+                for i in matched:
+                    stored = existing.get(copies[i]["barcode"]) or {}
+                    if stored.get("book") != copies[i]["book"]:
+                        rejected[i] = "Duplicate barcode"
+                    elif chunk_key and stored.get("ingest_key") == chunk_key:
+                        upserted.add(i)  # inserted by an earlier attempt at this same chunk
+
+        added = Counter()
+        for i, (row, key) in enumerate(copy_rows):
+            if i in rejected:
+                errors.append((row, rejected[i]))
+            elif i in upserted:
+                added[book_ids[key]] += 1
+        if added:
+            if chunk_key:
+                updates = [
+                    UpdateOne(
+                        {"_id": book_id, "ingest_chunks": {"$ne": chunk_key}},
+                        {"$inc": {"total_copies": n, "available_copies": n},
+                         "$addToSet": {"ingest_chunks": chunk_key}},
+                    )
+                    for book_id, n in added.items()
+                ]
+            else:
+                updates = [
+                    UpdateOne({"_id": book_id}, {"$inc": {"total_copies": n, "available_copies": n}})
+                    for book_id, n in added.items()
+                ]
+            Book._get_collection().bulk_write(updates, ordered=False)
+
+    return {"processed": len(rows) - len(errors), "failed": len(errors), "errors": errors}
+
+
+# -----------------------------------
+# Streaming driver
+# -----------------------------------
+class LineCounter:
+    """
+    Iterates CSV lines while tracking how much input has been consumed.
+    Byte lines (a spool file opened in binary mode) are decoded as UTF-8.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.consumed = 0
+
+    def __iter__(self):
+        first = True
+        for line in self.lines:
+            self.consumed += len(line)
+            if isinstance(line, bytes):
+                line = line.decode("utf-8-sig" if first else "utf-8")
+            first = False
+            yield line
+
+
+def iter_chunks(reader, size=CHUNK_SIZE):
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def resolve_file_books(path, chunk_size=CHUNK_SIZE):
+    """
+    Create every book a spooled CSV refers to, before any shard starts.
+
+    (title, author) is not unique in the Book collection, so two shards
+    upserting the same missing book at the same time could each insert one
+    and split its copies between them. Resolving the whole file once, in the
+    coordinator, leaves the shards only existing books to look up.
+    Returns the number of distinct books in the file.
+    """
+    seen = set()
+    with open(path, "rb") as f:
+        for chunk in iter_chunks(csv.DictReader(LineCounter(f)), chunk_size):
+            books_by_key = {}
+            for row in chunk:
+                try:
+                    key, book, _ = parse_row(row)
+                except (ValueError, TypeError):
+                    continue  # failed again, and reported, by the shard that owns the row
+                if key not in seen:
+                    seen.add(key)
+                    books_by_key[key] = book
+            if books_by_key:
+                resolve_books(books_by_key)
+    return len(seen)
+
+
+def ingest_csv(lines, on_chunk=None, chunk_size=CHUNK_SIZE, chunk_key=None):
+    """
+    Stream CSV lines (header first) through ingest_chunk one chunk at a time; the
+    file is parsed once and never held in memory. on_chunk(totals, consumed,
+    metrics, result) is called after every chunk with the amount of input read
+    so far and per-chunk throughput metrics. chunk_key(consumed), when given,
+    names each chunk for ingest_chunk from the input read up to its last row.
+    """
+    counter = LineCounter(lines)
+    reader = csv.DictReader(counter)
+    totals = {"processed": 0, "failed": 0, "chunks": 0}
+
+    for chunk in iter_chunks(reader, chunk_size):
+        chunk_start = time.time()
+        result = ingest_chunk(chunk, chunk_key(counter.consumed) if chunk_key else None)
+        elapsed = time.time() - chunk_start
+
+        totals["processed"] += result["processed"]
+        totals["failed"] += result["failed"]
+        totals["chunks"] += 1
+        if on_chunk:
+            metrics = {
+                "rows": len(chunk),
+                "seconds": elapsed,
+                "rows_per_sec": len(chunk) / elapsed if elapsed else 0.0,
+            }
+            on_chunk(totals, counter.consumed, metrics, result)
+
+    return totals
+
+
+def release_chunk_keys(task_id):
+    """Drop an upload's chunk keys from Book.ingest_chunks once it has finished."""
+    pattern = {"$regex": f"^{re.escape(task_id)}:"}
+    Book._get_collection().update_many({"ingest_chunks": pattern}, {"$pull": {"ingest_chunks": pattern}})
@@ -0,0 +1,48 @@
+# books/management/commands/bench_bulk_ingest.py
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from books.ingest import ingest_csv
+from books.models import Book, BookCopy
+
+HEADER = "title,author,category,publisher,published_year,price,language,no_of_pages,barcode\n"
+
+
+def _csv_lines(rows, run_id, copies_per_book=5):
+    yield HEADER
+    for i in range(rows):
+        book = i // copies_per_book
+        yield (
+            f"Bench Title {book},__bench_ingest_{run_id}__,Bench,Bench Press,"
+            f"{1950 + book % 70},{100 + book % 900},english,{100 + book % 500},BENCH-{run_id}-{i}\n"
+        )
+
+
+class Command(BaseCommand):
+    help = "Benchmark the streaming bulk ingester (books.ingest) at several catalog sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>9} {'seconds':>9} {'rows/s':>9} {'chunks':>7} {'slowest chunk rows/s':>21}")
+        for rows in options["rows"]:
+            run_id = uuid.uuid4().hex[:8]
+            chunk_rates = []
+            kwargs = {"chunk_size": options["chunk_size"]} if options["chunk_size"] else {}
+            start = time.perf_counter()
+            try:
+                totals = ingest_csv(
+                    _csv_lines(rows, run_id),
+                    on_chunk=lambda totals, consumed, metrics, result: chunk_rates.append(metrics["rows_per_sec"]),
+                    **kwargs,
+                )
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{rows:>9} {elapsed:>9.2f} {rows / elapsed:>9.0f} {totals['chunks']:>7} "
+                    f"{min(chunk_rates) if chunk_rates else 0:>21.0f}"
+                )
+            finally:
+                BookCopy._get_collection().delete_many({"barcode": {"$regex": f"^BENCH-{run_id}-"}})
+                Book._get_collection().delete_many({"author": f"__bench_ingest_{run_id}__"})
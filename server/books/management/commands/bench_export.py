@@ -0,0 +1,61 @@
+# books/management/commands/bench_export.py
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from backend.utils.export import iter_export, gzip_stream, EXPORT_FORMATS
+from books.models import Book, BookCopy
+from books.views import BOOK_EXPORT_FIELDS, COPY_EXPORT_FIELDS
+from borrow.models import BorrowRecord
+from borrow.views import BORROW_EXPORT_FIELDS
+
+COLLECTIONS = {
+    "books": (Book, BOOK_EXPORT_FIELDS),
+    "copies": (BookCopy, COPY_EXPORT_FIELDS),
+    "records": (BorrowRecord, BORROW_EXPORT_FIELDS),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure export throughput (docs/s, MB/s) and peak Python memory for the streamed "
+        "CSV/NDJSON exports. Output is generated and discarded; nothing is written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collections", nargs="+", choices=sorted(COLLECTIONS), default=sorted(COLLECTIONS))
+        parser.add_argument("--formats", nargs="+", choices=EXPORT_FORMATS, default=list(EXPORT_FORMATS))
+        parser.add_argument("--gzip", action="store_true", help="also measure gzip-compressed output")
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        kwargs = {"batch_size": options["batch_size"]} if options["batch_size"] else {}
+        variants = [False, True] if options["gzip"] else [False]
+
+        self.stdout.write(
+            f"{'collection':<10} {'format':<10} {'docs':>9} {'seconds':>8} {'docs/s':>9} "
+            f"{'MB out':>8} {'MB/s':>7} {'peak KB':>8}"
+        )
+        for name in options["collections"]:
+            document, fields = COLLECTIONS[name]
+            collection = document._get_collection()
+            docs = collection.estimated_document_count()
+            for fmt in options["formats"]:
+                for gzip in variants:
+                    body = iter_export(collection, fields, fmt=fmt, **kwargs)
+                    if gzip:
+                        body = gzip_stream(body)
+
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    size = sum(len(block) for block in body)
+                    elapsed = time.perf_counter() - start
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                    label = fmt + ("+gz" if gzip else "")
+                    mb = size / 1024 / 1024
+                    self.stdout.write(
+                        f"{name:<10} {label:<10} {docs:>9} {elapsed:>8.2f} "
+                        f"{docs / elapsed if elapsed else 0:>9.0f} {mb:>8.1f} "
+                        f"{mb / elapsed if elapsed else 0:>7.1f} {peak / 1024:>8.0f}"
+                    )
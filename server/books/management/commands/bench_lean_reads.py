@@ -0,0 +1,94 @@
+# books/management/commands/bench_lean_reads.py
+import time
+import tracemalloc
+from datetime import datetime
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from books.models import Book
+from backend.utils.json_utils import lean
+
+BENCH_CATEGORY = "__bench_lean_reads__"
+FIELDS = ("id", "title", "author", "category", "language", "cover_image_url", "related_books", "created_at")
+
+
+def _serialize_document(b):
+    return {
+        "id": str(b.id),
+        "title": b.title,
+        "author": b.author,
+        "category": b.category,
+        "language": b.language,
+        "cover_image_url": b.cover_image_url,
+        "related_books": [str(r.pk) if hasattr(r, "pk") else str(r) for r in b.related_books],
+    }
+
+
+def _serialize_raw(b):
+    return {
+        "id": str(b["_id"]),
+        "title": b.get("title"),
+        "author": b.get("author"),
+        "category": b.get("category"),
+        "language": b.get("language"),
+        "cover_image_url": b.get("cover_image_url"),
+        "related_books": [str(r) for r in b.get("related_books") or []],
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark full-document vs .only() vs lean (as_pymongo) reads of list_books rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded books afterwards")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        collection = Book._get_collection()
+
+        existing = collection.count_documents({"category": BENCH_CATEGORY})
+        if existing < rows:
+            self.stdout.write(f"Seeding {rows - existing} books...")
+            related = [ObjectId() for _ in range(5)]
+            for start in range(existing, rows, 10000):
+                collection.insert_many([
+                    {
+                        "title": f"Bench Book {i}",
+                        "author": f"Author {i % 1000}",
+                        "category": BENCH_CATEGORY,
+                        "edition": "1st",
+                        "language": "english",
+                        "publisher": "Bench Press",
+                        "cover_image_url": f"https://example.com/covers/{i}.jpg",
+                        "total_copies": 3,
+                        "available_copies": 3,
+                        "waitlist": [str(ObjectId()) for _ in range(20)],
+                        "related_books": related,
+                        "created_at": datetime.utcnow(),
+                    }
+                    for i in range(start, min(start + 10000, rows))
+                ], ordered=False)
+
+        modes = [
+            ("documents", lambda: Book.objects(category=BENCH_CATEGORY).no_dereference(), _serialize_document),
+            ("only()", lambda: Book.objects(category=BENCH_CATEGORY).only(*FIELDS).no_dereference(), _serialize_document),
+            ("lean", lambda: lean(Book.objects(category=BENCH_CATEGORY), *FIELDS), _serialize_raw),
+        ]
+
+        self.stdout.write(f"{'mode':<10} {'rows':>8} {'time (ms)':>10} {'peak alloc (MB)':>16}")
+        try:
+            for name, make_queryset, serialize in modes:
+                start = time.perf_counter()
+                result = [serialize(b) for b in make_queryset()]
+                elapsed = time.perf_counter() - start
+
+                # Separate pass so tracing overhead does not skew the timing
+                tracemalloc.start()
+                [serialize(b) for b in make_queryset()]
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                self.stdout.write(f"{name:<10} {len(result):>8} {elapsed * 1000:>10.0f} {peak / 1e6:>16.1f}")
+        finally:
+            if not options["keep"]:
+                collection.delete_many({"category": BENCH_CATEGORY})
@@ -0,0 +1,66 @@
+# books/management/commands/stress_copy_counters.py
+import random
+import threading
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from books.models import Book, BookCopy
+
+
+class Command(BaseCommand):
+    help = (
+        "Flip BookCopy availability from many threads (parallel borrow/return traffic) "
+        "and check that Book.total_copies / available_copies stay exact."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--copies", type=int, default=20)
+        parser.add_argument("--operations", type=int, default=500, help="Operations per thread")
+
+    def handle(self, *args, **options):
+        book = Book(title=f"Counter stress {uuid.uuid4().hex[:8]}", author="stress")
+        book.save()
+        copy_ids = []
+        for i in range(options["copies"]):
+            copy = BookCopy(book=book, barcode=f"STRESS-{book.id}-{i}")
+            copy.save()
+            copy_ids.append(copy.id)
+
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(options["operations"]):
+                    copy = BookCopy.objects.get(id=random.choice(copy_ids))
+                    copy.is_available = not copy.is_available  # borrow or return
+                    copy.save()
+            except Exception as e:
+                errors.append(e)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            if errors:
+                raise CommandError(f"{len(errors)} worker(s) failed: {errors[0]}")
+
+            book.reload()
+            actual_total = BookCopy.objects(book=book).count()
+            actual_available = BookCopy.objects(book=book, is_available=True).count()
+            operations = options["threads"] * options["operations"]
+            self.stdout.write(f"{operations} operations in {elapsed:.2f}s ({operations / elapsed:.0f} ops/s)")
+            self.stdout.write(f"total_copies     {book.total_copies} (actual {actual_total})")
+            self.stdout.write(f"available_copies {book.available_copies} (actual {actual_available})")
+
+            if book.total_copies != actual_total or book.available_copies != actual_available:
+                raise CommandError("Book counters drifted from the BookCopy collection")
+            self.stdout.write(self.style.SUCCESS("Counters exact"))
+        finally:
+            BookCopy.objects(book=book).delete()
+            book.delete()
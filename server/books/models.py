@@ -1,8 +1,11 @@
 from mongoengine import (
     Document, StringField, IntField, ReferenceField,
-    BooleanField, DateTimeField, ListField
+    BooleanField, DateTimeField, ListField, ObjectIdField
 )
 from datetime import datetime
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY_ERROR = 11000
 class Book(Document):
     title = StringField(required=True, max_length=200)
     author = StringField(required=True, max_length=100)
@@ -22,6 +25,9 @@ class Book(Document):
     waitlist = ListField(StringField())
     related_books = ListField(ReferenceField('self'))
     created_at = DateTimeField(default=datetime.utcnow)
+    # Bulk-upload chunks whose new copies are already counted in the counters
+    # above ("<task_id>:<offset>"); pulled again when the upload finishes
+    ingest_chunks = ListField(StringField())
 
     meta = {
         "indexes": [
@@ -32,7 +38,11 @@ class Book(Document):
             },
             # ✅ Additional useful filters
             "category",
+            ("category", "-created_at"),  # homepage shelves
+            ("-created_at", "-id"),  # keyset pagination in list_books
             "author",
+            ("title", "author"),  # bulk upload book resolution
+            {"fields": ["ingest_chunks"], "sparse": True},  # bulk upload cleanup
             "published_year",
             "language",
         ]
@@ -41,15 +51,32 @@ class Book(Document):
     def __str__(self):
         return f"{self.title} ({self.edition}) by {self.author}"
 
+    # -----------------------------------------------------------
+    # Counters are only ever changed with atomic $inc updates
+    # -----------------------------------------------------------
+    @classmethod
+    def adjust_counters(cls, book_id, total=0, available=0):
+        inc = {}
+        if total:
+            inc["total_copies"] = total
+        if available:
+            inc["available_copies"] = available
+        if inc:
+            cls._get_collection().update_one({"_id": book_id}, {"$inc": inc})
+
     def increment_copies(self, count=1):
+        Book.adjust_counters(self.pk, total=count, available=count)
         self.total_copies += count
         self.available_copies += count
-        self.save()
 
     def decrement_available(self, count=1):
-        if self.available_copies >= count:
+        result = Book._get_collection().update_one(
+            {"_id": self.pk, "available_copies": {"$gte": count}},
+            {"$inc": {"available_copies": -count}},
+        )
+        if result.modified_count:
             self.available_copies -= count
-            self.save()
+        return result.modified_count == 1
 
 # ---------------------------------------------------------------------------
 # 📗 BookCopy Model
@@ -70,6 +97,9 @@ class BookCopy(Document):
     last_borrowed_at = DateTimeField()
     
     vendor = StringField(max_length=100)
+    checkout_token = ObjectIdField()  # set by batch checkout to tell its claims apart
+    last_returned_at = DateTimeField()  # set by batch return to tell its check-ins apart
+    ingest_key = StringField()  # bulk-upload chunk that inserted this copy
     meta = {
     "indexes": [
         {"fields": ["$barcode", "$vendor"], "default_language": "english"},
@@ -77,51 +107,128 @@ class BookCopy(Document):
         "is_damaged",
         "condition",
         "vendor",
+        ("-added_at", "-id"),  # keyset pagination in list_book_copies
     ]
 }
 
     def __str__(self):
         return f"{self.book.title} - Copy: {self.barcode}"
 
+    def _book_id(self):
+        # Read the raw reference so the Book is not dereferenced just for its id
+        ref = self._data.get("book")
+        return getattr(ref, "pk", None) or getattr(ref, "id", None) or ref
+
     # -----------------------------------------------------------
     # 🟢 Auto-update available_copies on save
     # -----------------------------------------------------------
     def save(self, *args, **kwargs):
         is_new = self.pk is None  # check if this is a new document
-        old_copy = None
 
-        # If updating existing copy, check if availability changed
+        # Availability / book changes are written first with find_one_and_update,
+        # which returns the stored values it replaced. The counter deltas come
+        # from that pre-image, so concurrent writers can never double count.
+        # Validation runs before that write, and the counters follow it straight
+        # away, so a save that fails afterwards (e.g. a duplicate barcode) still
+        # leaves them matching what is stored.
         if not is_new:
-            old_copy = BookCopy.objects(id=self.id).first()
+            changed = self._get_changed_fields()
+            if "is_available" in changed or "book" in changed:
+                if kwargs.get("validate", True):
+                    self.validate(clean=kwargs.get("clean", True))
+                son = self.to_mongo()
+                moved = BookCopy._get_collection().find_one_and_update(
+                    {"_id": self.pk},
+                    {"$set": {"is_available": son.get("is_available"), "book": son.get("book")}},
+                    projection={"book": 1, "is_available": 1},
+                )
+                self._changed_fields = [f for f in self._changed_fields if f not in ("is_available", "book")]
+                if moved:
+                    self._move_counters(moved)
 
         result = super().save(*args, **kwargs)
 
         # If it's a new copy, increment both total and available count
         if is_new:
-            self.book.total_copies += 1
-            if self.is_available:
-                self.book.available_copies += 1
-            self.book.save()
-
-        # If updating existing record and availability changed
-        elif old_copy and old_copy.is_available != self.is_available:
-            if self.is_available:
-                self.book.available_copies += 1
-            else:
-                self.book.available_copies -= 1
-            self.book.save()
+            Book.adjust_counters(self._book_id(), total=1, available=1 if self.is_available else 0)
 
         return result
 
+    def _move_counters(self, stored):
+        """Counter deltas from the stored availability / book to this copy's."""
+        was_available = 1 if stored.get("is_available") else 0
+        now_available = 1 if self.is_available else 0
+        if stored.get("book") == self._book_id():
+            Book.adjust_counters(self._book_id(), available=now_available - was_available)
+        else:
+            Book.adjust_counters(stored.get("book"), total=-1, available=-was_available)
+            Book.adjust_counters(self._book_id(), total=1, available=now_available)
+
+    # -----------------------------------------------------------
+    # 📦 Bulk provisioning (one insert_many, one counter $inc)
+    # -----------------------------------------------------------
+    @classmethod
+    def bulk_create(cls, book_id, barcodes, condition="Good", vendor=None, remarks=None):
+        """
+        Insert copies of one book with a single insert_many(ordered=False)
+        and bump the Book counters once for the copies actually inserted.
+        Barcodes that clash with the unique index are reported, not fatal.
+        Returns (created_barcodes, failed) where failed is [{"barcode", "error"}].
+        """
+        now = datetime.utcnow()
+        docs = []
+        for barcode in barcodes:
+            doc = {
+                "book": book_id,
+                "barcode": barcode,
+                "is_available": True,
+                "is_damaged": False,
+                "condition": condition,
+                "added_at": now,
+            }
+            if vendor:
+                doc["vendor"] = vendor
+            if remarks:
+                doc["remarks"] = remarks
+            docs.append(doc)
+
+        rejected = {}
+        if docs:
+            try:
+                cls._get_collection().insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get("writeErrors", []):
+                    rejected[err["index"]] = (
+                        "Duplicate barcode" if err.get("code") == DUPLICATE_KEY_ERROR else err.get("errmsg")
+                    )
+
+        created = [b for i, b in enumerate(barcodes) if i not in rejected]
+        failed = [{"barcode": barcodes[i], "error": reason} for i, reason in sorted(rejected.items())]
+        Book.adjust_counters(book_id, total=len(created), available=len(created))
+        return created, failed
+
     # -----------------------------------------------------------
     # 🔴 Auto-update on delete
     # -----------------------------------------------------------
     def delete(self, *args, **kwargs):
-        # Decrease counters before deleting
-        if self.is_available:
-            self.book.available_copies = max(0, self.book.available_copies - 1)
-
-        self.book.total_copies = max(0, self.book.total_copies - 1)
-        self.book.save()
-
-        return super().delete(*args, **kwargs)
+        # Take the copy off the shelf and read back its stored state in one
+        # step, then delete through Document.delete so signals and delete
+        # rules still run. A failed delete puts the copy back.
+        stored = BookCopy._get_collection().find_one_and_update(
+            {"_id": self.pk},
+            {"$set": {"is_available": False}},
+            projection={"book": 1, "is_available": 1},
+        )
+        try:
+            result = super().delete(*args, **kwargs)
+        except Exception:
+            if stored and stored.get("is_available"):
+                BookCopy._get_collection().update_one({"_id": self.pk}, {"$set": {"is_available": True}})
+            raise
+        if stored:
+            Book.adjust_counters(
+                stored.get("book"),
+                total=-1,
+                available=-1 if stored.get("is_available") else 0,
+            )
+        return result
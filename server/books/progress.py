@@ -0,0 +1,81 @@
+# books/progress.py
+import json
+import os
+import time
+import redis.asyncio as aioredis
+from backend.utils.redis_client import REDIS_URL, upload_channel
+
+STREAM_INTERVAL = float(os.getenv("UPLOAD_STREAM_INTERVAL", 1.0))  # seconds between pushed snapshots
+KEEPALIVE_SECONDS = 15
+FINAL_STATUSES = ("completed", "validated", "failed")
+
+
+def summarize_upload_progress(data):
+    """Fold the flat "shard:<i>:<field>" hash fields into a shards list and derive progress from bytes read."""
+    summary, shards = {}, {}
+    for key, value in data.items():
+        if key.startswith("shard:"):
+            _, index, field = key.split(":", 2)
+            shards.setdefault(int(index), {"shard": int(index)})[field] = value
+        elif key == "validation":
+            summary[key] = json.loads(value)
+        else:
+            summary[key] = value
+
+    total_bytes = int(summary.get("total_bytes") or 0)
+    if summary.get("status") not in ("completed", "validated") and total_bytes:
+        summary["progress"] = round(int(summary.get("bytes_done") or 0) / total_bytes * 100, 2)
+    for shard in shards.values():
+        shard_bytes = int(shard.get("total_bytes") or 0)
+        shard["progress"] = round(int(shard.get("bytes_done") or 0) / shard_bytes * 100, 2) if shard_bytes else 100.0
+
+    summary["shards"] = [shards[i] for i in sorted(shards)]
+    return summary
+
+
+def _sse(data, event="progress"):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_upload_progress(task_id):
+    """
+    Server-sent events for one upload job.
+
+    Workers publish a notification on the job's channel whenever they write
+    its hash. Notifications only mark the job as changed: however many arrive,
+    at most one snapshot is read and pushed per STREAM_INTERVAL, so the update
+    rate is fixed no matter how many shards report. The stream ends once the
+    job reaches a final status or its hash expires.
+    """
+    client = aioredis.from_url(REDIS_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(upload_channel(task_id))
+    try:
+        changed, last_event = True, time.monotonic()
+        while True:
+            if changed:
+                raw = await client.hgetall(task_id)
+                if not raw:
+                    yield _sse({"error": "Invalid or expired task_id"}, "error")
+                    return
+                summary = summarize_upload_progress({k.decode(): v.decode() for k, v in raw.items()})
+                yield _sse(summary)
+                if summary.get("status") in FINAL_STATUSES:
+                    return
+                changed, last_event = False, time.monotonic()
+            elif time.monotonic() - last_event >= KEEPALIVE_SECONDS:
+                if not await client.exists(task_id):
+                    yield _sse({"error": "Invalid or expired task_id"}, "error")
+                    return
+                yield ": keepalive\n\n"
+                last_event = time.monotonic()
+
+            # Drain notifications until the next tick
+            tick_end = time.monotonic() + STREAM_INTERVAL
+            while (remaining := tick_end - time.monotonic()) > 0:
+                if await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining):
+                    changed = True
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,82 @@
+# books/shelves.py
+import json
+import logging
+import redis
+from kombu.exceptions import OperationalError
+from books.models import Book
+from backend.utils.redis_client import redis_client
+
+HOMEPAGE_SHELVES_KEY = "homepage_shelves"
+HOMEPAGE_SHELVES_TTL = 60 * 60  # safety net; writes rebuild the snapshot sooner
+SHELF_COUNT = 10
+BOOKS_PER_SHELF = 10
+
+logger = logging.getLogger(__name__)
+
+
+SHELF_FIELDS = {"title": 1, "author": 1, "category": 1, "cover_image_url": 1, "related_books": 1}
+
+
+def build_homepage_shelves():
+    """
+    Build the homepage shelves: the first SHELF_COUNT categories (distinct
+    scan of the category index), then one query per category reading its
+    BOOKS_PER_SHELF newest books off the (category, -created_at) index.
+    Cost depends on the shelf sizes, not on how many books a category has.
+    """
+    collection = Book._get_collection()
+    categories = sorted(c for c in collection.distinct("category") if c)[:SHELF_COUNT]
+
+    result = {}
+    for category in categories:
+        books = collection.find(
+            {"category": category}, SHELF_FIELDS,
+            sort=[("category", 1), ("created_at", -1)], limit=BOOKS_PER_SHELF,
+        )
+        result[category] = [
+            {
+                "id": str(b["_id"]),
+                "title": b.get("title"),
+                "author": b.get("author"),
+                "category": b.get("category"),
+                "cover_image_url": b.get("cover_image_url"),
+                "related_books": [str(r) for r in b.get("related_books") or []],
+            }
+            for b in books
+        ]
+    return result
+
+
+def store_homepage_shelves():
+    """Rebuild the shelves and replace the cached snapshot."""
+    shelves = build_homepage_shelves()
+    redis_client.r.setex(HOMEPAGE_SHELVES_KEY, HOMEPAGE_SHELVES_TTL, json.dumps(shelves))
+    return shelves
+
+
+def get_homepage_shelves():
+    """Serve the cached snapshot, building it on a cold cache."""
+    try:
+        cached = redis_client.r.get(HOMEPAGE_SHELVES_KEY)
+        if cached:
+            return json.loads(cached)
+        return store_homepage_shelves()
+    except redis.RedisError:
+        return build_homepage_shelves()
+
+
+def invalidate_homepage_shelves():
+    """
+    Called after catalog writes. The snapshot keeps being served while a
+    worker rebuilds it; if the task cannot be queued the snapshot is dropped.
+    """
+    from books.task import rebuild_homepage_shelves
+
+    try:
+        rebuild_homepage_shelves.delay()
+    except OperationalError as e:  # broker unreachable
+        logger.warning("Could not queue homepage shelf rebuild: %s", e)
+        try:
+            redis_client.r.delete(HOMEPAGE_SHELVES_KEY)
+        except redis.RedisError:
+            pass
@@ -1,81 +1,201 @@
 # books/tasks.py
-import csv, io, time
-from celery import shared_task
-from mongoengine import DoesNotExist
-from books.models import Book, BookCopy
+import csv, json, os, time
+from itertools import chain
+from celery import shared_task, chord
+from books.ingest import (
+    ingest_csv, resolve_file_books, release_chunk_keys, plan_shards, iter_range_lines, errors_path,
+    merge_error_files,
+)
 from backend.utils.redis_client import redis_client
+from books.shelves import store_homepage_shelves
+from books.validation import validate_csv
+
+
+@shared_task
+def rebuild_homepage_shelves():
+    """Rebuild the cached homepage shelves snapshot after catalog writes."""
+    store_homepage_shelves()
+
+
+def _job_state(task_id):
+    return {k.decode(): v.decode() for k, v in redis_client.hgetall(task_id).items()}
+
+
+def _shard_totals(state, shard):
+    return {
+        "processed": int(state.get(f"shard:{shard}:processed") or 0),
+        "failed": int(state.get(f"shard:{shard}:failed") or 0),
+    }
 
 
 @shared_task(bind=True)
-def process_bulk_upload(self, csv_data_str, task_id):
+def validate_bulk_upload(self, path, task_id):
+    """Dry run: validate a spooled catalog CSV, store the report and write nothing."""
+    redis_client.update_upload(task_id, {"status": "validating"})
+    report = validate_csv(path)
+    if os.path.exists(path):
+        os.remove(path)
+    redis_client.update_upload(task_id, {
+        "status": "validated",
+        "progress": 100.0,
+        "validation": json.dumps(report),
+    })
+    return report
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_bulk_upload(self, path, task_id):
+    """
+    Background task to insert books and book copies from a spooled catalog CSV.
+    The data rows are split into line-aligned byte ranges that run as a Celery
+    group of process_upload_shard tasks across workers; finalize_bulk_upload
+    runs as the chord callback once every shard is done.
+
+    Re-running the task for the same task_id keeps the stored shard plan and
+    checkpoints, so only the work that was not committed yet is redone.
+
+    A first run validates the whole file up front (books.validation) and
+    stores the report under "validation"; rows it flags fail in parse_row
+    before any of their chunk's database work.
+    """
+    state = _job_state(task_id)
+    if state.get("shards"):
+        ranges = [
+            (int(state[f"shard:{i}:start"]), int(state[f"shard:{i}:end"]))
+            for i in range(int(state["shards"]))
+        ]
+        redis_client.update_upload(task_id, {"status": "running", "resumed_at": time.time()})
+    else:
+        redis_client.update_upload(task_id, {"status": "validating"})
+        report = validate_csv(path)
+        # Books are created here, once, so concurrent shards never upsert the same one
+        resolve_file_books(path)
+        ranges = plan_shards(path)
+        redis_client.update_upload(task_id, {
+            "status": "running",
+            "validation": json.dumps(report),
+            "started_at": time.time(),
+            "shards": len(ranges),
+            "total_bytes": sum(end - start for start, end in ranges),
+            "bytes_done": 0,
+            **{f"shard:{i}:start": start for i, (start, _) in enumerate(ranges)},
+            **{f"shard:{i}:end": end for i, (_, end) in enumerate(ranges)},
+            **{f"shard:{i}:total_bytes": end - start for i, (start, end) in enumerate(ranges)},
+            **{f"shard:{i}:status": "queued" for i in range(len(ranges))},
+        })
+
+    chord(
+        process_upload_shard.s(path, task_id, i, start, end)
+        for i, (start, end) in enumerate(ranges)
+    )(finalize_bulk_upload.s(path, task_id))
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_upload_shard(self, path, task_id, shard, start, end):
+    """
+    Ingest one byte range of a spooled CSV. The file is read incrementally and
+    streamed through books.ingest in chunks: one book prefetch, one bulk upsert,
+    one barcode-keyed copy upsert and one aggregated counter $inc per chunk.
+
+    After every chunk the shard's checkpoint (byte offset reached and size of
+    its error file) is written in the same Redis transaction as the progress
+    counters. A redelivered or re-run shard seeks to the checkpoint, trims its
+    error file back to the checkpointed size and carries on from there; rows
+    of a chunk that was written but not checkpointed are replayed harmlessly
+    because copies are upserted by barcode and counted once per chunk key.
     """
-    Background task to insert book copies and update book counters automatically.
-    Expects CSV to contain details of each copy; total_copies and available_copies
-    are managed automatically by BookCopy.save().
+    state = _job_state(task_id)
+    if state.get(f"shard:{shard}:status") == "completed":
+        return _shard_totals(state, shard)
+
+    offset = int(state.get(f"shard:{shard}:offset") or start)
+    errors_size = int(state.get(f"shard:{shard}:errors_bytes") or 0)
+    shard_start = time.time()
+    redis_client.update_upload(task_id, {f"shard:{shard}:status": "resuming" if offset > start else "running"})
+
+    try:
+        return _ingest_shard(path, task_id, shard, end, offset, errors_size, shard_start)
+    except Exception:
+        # Lets resume_upload re-queue the job straight away instead of waiting for it to stall
+        redis_client.update_upload(task_id, {f"shard:{shard}:status": "failed", "status": "failed"})
+        raise
+
+
+def _ingest_shard(path, task_id, shard, end, offset, errors_size, shard_start):
+    # Drop failed rows that were written after the last checkpoint
+    failed_path = errors_path(task_id, shard)
+    if os.path.exists(failed_path):
+        with open(failed_path, "r+b") as f:
+            f.truncate(errors_size)
+
+    with open(path, "rb") as spooled, open(failed_path, "a", newline="", encoding="utf-8") as failed_file:
+        header = spooled.readline()
+        fieldnames = next(csv.reader([header.decode("utf-8-sig")])) + ["error"]
+        writer = csv.DictWriter(failed_file, fieldnames=fieldnames, extrasaction="ignore")
+        if errors_size == 0:
+            writer.writeheader()
+        read = {"bytes": len(header), "offset": offset}
+
+        def report(totals, consumed, metrics, result):
+            for row, reason in result["errors"]:
+                writer.writerow({**row, "error": reason})
+            failed_file.flush()
+
+            elapsed = time.time() - shard_start
+            read["offset"] += consumed - read["bytes"]
+            redis_client.incr_upload_progress(task_id, shard, {
+                "processed": result["processed"],
+                "failed": result["failed"],
+                "bytes_done": consumed - read["bytes"],
+            }, fields={
+                "offset": read["offset"],
+                "errors_bytes": os.fstat(failed_file.fileno()).st_size,
+                "chunk_rows_per_sec": round(metrics["rows_per_sec"], 1),
+                "rows_per_sec": round((totals["processed"] + totals["failed"]) / elapsed, 1) if elapsed else 0,
+            })
+            read["bytes"] = consumed
+
+        # Chunks are named by the absolute offset of their end, which a replay
+        # from the same checkpoint reproduces
+        ingest_csv(
+            chain([header], iter_range_lines(spooled, offset, end)), on_chunk=report,
+            chunk_key=lambda consumed: f"{task_id}:{offset + consumed - len(header)}",
+        )
+
+    redis_client.update_upload(task_id, {
+        f"shard:{shard}:status": "completed",
+        f"shard:{shard}:duration": round(time.time() - shard_start, 2),
+    })
+    # Totals come from the checkpointed counters so earlier runs are included
+    return _shard_totals(_job_state(task_id), shard)
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def finalize_bulk_upload(self, shard_results, path, task_id):
     """
-    start_time = time.time()
-    reader = csv.DictReader(io.StringIO(csv_data_str))
-    total = sum(1 for _ in csv.DictReader(io.StringIO(csv_data_str)))
-    processed = 0
-    failed = 0
-
-    # Re-read since we exhausted iterator
-    reader = csv.DictReader(io.StringIO(csv_data_str))
-    print(reader)
-    for row in reader:
-        try:
-            # Try to find the book by title & author
-            book = Book.objects(title=row.get("title"), author=row.get("author")).first()
-
-            # If book does not exist, create it
-            if not book:
-                book = Book(
-                    title=row.get("title"),
-                    author=row.get("author"),
-                    category=row.get("category"),
-                    edition=row.get("edition", "1st"),
-                    publisher=row.get("publisher"),
-                    published_year=int(row.get("published_year", 0)) or None,
-                    price=int(row.get("price", 0)),
-                    location=row.get("location"),
-                    isbn=row.get("isbn"),
-                    language=row.get("language", "English"),
-                    no_of_pages=int(row.get("no_of_pages", 0)) or None,
-                    cover_image_url=row.get("cover_image_url"),
-                    ebook_url=row.get("ebook_url"),
-                )
-                book.save()
-
-            # Create a new copy if barcode is unique
-            if row.get("barcode"):
-                BookCopy(
-                    book=book,
-                    barcode=row.get("barcode"),
-                    is_available=True,
-                    is_damaged=False,
-                    condition="Good"
-                ).save()
-                # BookCopy.save() will automatically increment total_copies and available_copies
-
-            processed += 1
-
-        except Exception as e:
-            failed += 1
-
-        # Update progress every 50 records
-        if processed % 50 == 0 or processed == total:
-            progress_data = {
-                "processed": processed,
-                "failed": failed,
-                "total": total,
-                "progress": round((processed / total) * 100, 2),
-                "status": "running",
-            }
-            redis_client.hset(task_id, mapping=progress_data)
-
-    # Mark complete
-    progress_data.update({
+    Chord callback: settle the job counters from the shard results, merge the
+    shard error files into one downloadable CSV and mark the job complete.
+    """
+    processed = sum(r["processed"] for r in shard_results)
+    failed = sum(r["failed"] for r in shard_results)
+    started_at = redis_client.r.hget(task_id, "started_at")
+    duration = time.time() - float(started_at) if started_at else 0.0
+
+    merged = merge_error_files(task_id, len(shard_results))
+    release_chunk_keys(task_id)
+    # The spool file is kept until now so an interrupted job can be resumed
+    if os.path.exists(path):
+        os.remove(path)
+
+    # New books change the shelves; this already runs in a worker
+    store_homepage_shelves()
+
+    redis_client.update_upload(task_id, {
+        "processed": processed,
+        "failed": failed,
+        "progress": 100.0,
         "status": "completed",
-        "duration": round(time.time() - start_time, 2)
+        "errors_file": f"/api/admin/upload-errors/{task_id}/" if merged else "",
+        "rows_per_sec": round((processed + failed) / duration, 1) if duration else 0,
+        "duration": round(duration, 2),
     })
-    redis_client.hset(task_id, mapping=progress_data)
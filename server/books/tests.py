@@ -1,3 +1,184 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import datetime, timedelta
+from bson import ObjectId
+from django.test import SimpleTestCase
+from backend.utils.pagination import (
+    encode_cursor, decode_cursor, keyset_filter, keyset_sort, keyset_result, parse_sort,
+)
+from books.ingest import plan_shards, iter_range_lines, parse_row, NUMERIC_RANGES
 
-# Create your tests here.
+SORT = "-borrow_date,-id"
+
+
+# -------------------------
+# Keyset pagination (backend/utils/pagination.py)
+# -------------------------
+class CursorTests(SimpleTestCase):
+    def test_round_trip_keeps_types_and_direction(self):
+        values = [datetime(2024, 5, 1, 12, 30), ObjectId(), 7, "x"]
+        self.assertEqual(decode_cursor(encode_cursor(values, "prev")), (values, "prev"))
+
+    def test_default_direction_is_next(self):
+        self.assertEqual(decode_cursor(encode_cursor([1]))[1], "next")
+
+    def test_malformed_cursor_raises_value_error(self):
+        for cursor in ("", "not-base64!", encode_cursor([1])[:-3] + "###"):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_unknown_direction_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor([1], "sideways"))
+
+
+class KeysetFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.date, self.oid = datetime(2024, 1, 1), ObjectId()
+
+    def test_parse_sort_maps_id_to_db_field(self):
+        self.assertEqual(parse_sort(SORT), [("borrow_date", "borrow_date", -1), ("id", "_id", -1)])
+
+    def test_descending_sort_seeks_below_cursor(self):
+        self.assertEqual(keyset_filter(SORT, [self.date, self.oid]), {"$or": [
+            {"borrow_date": {"$lt": self.date}},
+            {"borrow_date": self.date, "_id": {"$lt": self.oid}},
+        ]})
+
+    def test_backward_flips_the_comparison(self):
+        self.assertEqual(keyset_filter(SORT, [self.date, self.oid], backward=True), {"$or": [
+            {"borrow_date": {"$gt": self.date}},
+            {"borrow_date": self.date, "_id": {"$gt": self.oid}},
+        ]})
+
+    def test_mixed_orders(self):
+        self.assertEqual(keyset_filter("-fine,id", [5.0, self.oid]), {"$or": [
+            {"fine": {"$lt": 5.0}},
+            {"fine": 5.0, "_id": {"$gt": self.oid}},
+        ]})
+
+    def test_single_field_has_no_or(self):
+        self.assertEqual(keyset_filter("id", [self.oid]), {"_id": {"$gt": self.oid}})
+
+    def test_value_count_must_match_sort(self):
+        with self.assertRaises(ValueError):
+            keyset_filter(SORT, [self.date])
+
+    def test_sort_is_reversed_backward(self):
+        self.assertEqual(keyset_sort(SORT), {"borrow_date": -1, "_id": -1})
+        self.assertEqual(keyset_sort(SORT, backward=True), {"borrow_date": 1, "_id": 1})
+
+
+class KeysetResultTests(SimpleTestCase):
+    def rows(self, n):
+        start = datetime(2024, 1, 1)
+        return [{"_id": ObjectId(), "borrow_date": start - timedelta(days=i)} for i in range(n)]
+
+    def test_extra_row_means_next_page(self):
+        rows = self.rows(4)
+        page = keyset_result(list(rows), SORT, 3, None, False, None)
+        self.assertEqual(page["items"], rows[:3])
+        self.assertTrue(page["has_next"])
+        self.assertFalse(page["has_prev"])
+        values, direction = decode_cursor(page["next_cursor"])
+        self.assertEqual((values, direction), ([rows[2]["borrow_date"], rows[2]["_id"]], "next"))
+
+    def test_last_page_has_no_next_cursor(self):
+        page = keyset_result(self.rows(2), SORT, 3, [datetime(2025, 1, 1), ObjectId()], False, None)
+        self.assertIsNone(page["next_cursor"])
+        self.assertTrue(page["has_prev"])
+
+    def test_backward_page_is_returned_in_sort_order(self):
+        rows = self.rows(3)  # a backward query yields rows oldest first
+        page = keyset_result(list(reversed(rows)), SORT, 3, [datetime(2020, 1, 1), ObjectId()], True, None)
+        self.assertEqual(page["items"], rows)
+        self.assertTrue(page["has_next"])
+        self.assertFalse(page["has_prev"])
+
+    def test_empty_page_has_no_cursors(self):
+        page = keyset_result([], SORT, 3, None, False, 2)
+        self.assertFalse(page["has_next"] or page["has_prev"])
+        self.assertIsNone(page["next_cursor"])
+
+
+# -------------------------
+# Bulk upload sharding (books/ingest.py)
+# -------------------------
+class PlanShardsTests(SimpleTestCase):
+    def spool(self, lines):
+        f = tempfile.NamedTemporaryFile("wb", suffix=".csv", delete=False)
+        f.write(b"title,author,barcode\n" + b"".join(lines))
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def read_ranges(self, path, ranges):
+        with open(path, "rb") as f:
+            return [line for start, end in ranges for line in iter_range_lines(f, start, end)]
+
+    def test_ranges_cover_every_line_exactly_once(self):
+        lines = [f"Book {i},Author {i % 7},BC-{i:05d}\n".encode() for i in range(1000)]
+        path = self.spool(lines)
+        ranges = plan_shards(path, shard_bytes=1024, max_shards=8)
+
+        self.assertEqual(len(ranges), 8)
+        self.assertEqual(ranges[0][0], len(b"title,author,barcode\n"))
+        self.assertEqual(ranges[-1][1], os.path.getsize(path))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+        self.assertEqual(self.read_ranges(path, ranges), lines)
+
+    def test_small_file_is_one_shard(self):
+        path = self.spool([b"A,B,1\n", b"C,D,2\n"])
+        self.assertEqual(len(plan_shards(path, shard_bytes=1024)), 1)
+
+    def test_boundaries_start_on_a_new_line(self):
+        lines = [(("x" * (i % 50)) + f",a,{i}\n").encode() for i in range(300)]
+        path = self.spool(lines)
+        with open(path, "rb") as f:
+            data = f.read()
+        for start, _ in plan_shards(path, shard_bytes=512, max_shards=5):
+            self.assertEqual(data[start - 1:start], b"\n")
+
+    def test_header_only_file(self):
+        path = self.spool([])
+        size = os.path.getsize(path)
+        self.assertEqual(plan_shards(path), [(size, size)])
+
+
+# -------------------------
+# Row parsing (books/ingest.py)
+# -------------------------
+class ParseRowTests(SimpleTestCase):
+    def row(self, **values):
+        return {"title": " Dune ", "author": "Frank Herbert", "barcode": " BC-1 ", **values}
+
+    def test_valid_row(self):
+        key, book, barcode = parse_row(self.row(published_year="1965", price="+12", no_of_pages=""))
+        self.assertEqual(key, ("Dune", "Frank Herbert"))
+        self.assertEqual((book["published_year"], book["price"]), (1965, 12))
+        self.assertNotIn("no_of_pages", book)
+        self.assertEqual(barcode, "BC-1")
+
+    def test_missing_title_or_author(self):
+        for row in (self.row(title=" "), self.row(author="")):
+            with self.assertRaises(ValueError):
+                parse_row(row)
+
+    def test_rejects_what_the_validator_rejects(self):
+        # The validator's INTEGER_PATTERN refuses these; parse_row must agree
+        for value in ("1_000", "12.0", "1e3", "ten", "0x10"):
+            with self.assertRaises(ValueError, msg=value):
+                parse_row(self.row(price=value))
+
+    def test_ranges(self):
+        _, high = NUMERIC_RANGES["published_year"]
+        with self.assertRaises(ValueError):
+            parse_row(self.row(published_year=str(high + 1)))
+        with self.assertRaises(ValueError):
+            parse_row(self.row(price="-1"))
+        with self.assertRaises(ValueError):
+            parse_row(self.row(no_of_pages="0"))
+
+    def test_blank_barcode_is_none(self):
+        self.assertIsNone(parse_row(self.row(barcode="  "))[2])
@@ -14,6 +14,7 @@ urlpatterns = [
 
     # BookCopy endpoints
     path('copies/create/', views.create_book_copy, name='create_book_copy'),
+    path('copies/bulk-create/', views.bulk_create_book_copies, name='bulk_create_book_copies'),
     path('copies/', views.list_book_copies, name='list_book_copies'),
   
     path('copies/<str:copy_id>/', views.get_book_copy, name='get_book_copy'),
@@ -22,6 +23,11 @@ urlpatterns = [
     path('copies/<str:copy_id>/delete/', views.delete_book_copy, name='delete_book_copy'),
     path('admin/upload-books/', views.bulk_upload_books, name='bulk_upload_books'),
     path('admin/upload-progress/<str:task_id>/', views.upload_progress, name='upload_progress'),
+    path('admin/upload-progress/<str:task_id>/stream/', views.upload_progress_stream, name='upload_progress_stream'),
+    path('admin/upload-resume/<str:task_id>/', views.resume_upload, name='resume_upload'),
+    path('admin/upload-errors/<str:task_id>/', views.upload_errors, name='upload_errors'),
+    path('admin/export/books/', views.export_books, name='export_books'),
+    path('admin/export/copies/', views.export_book_copies, name='export_book_copies'),
     path('library_stats/', views.library_stats, name='library_stats'),
     
 ]
@@ -0,0 +1,114 @@
+# books/validation.py
+import os
+import time
+import pandas as pd
+from books.ingest import INTEGER_PATTERN, NUMERIC_RANGES
+from books.models import BookCopy
+
+VALIDATION_CHUNK_ROWS = int(os.getenv("BULK_UPLOAD_VALIDATION_CHUNK_ROWS", 200000))
+ERROR_SAMPLE_SIZE = 1000  # individual problems kept in the report; counts cover every row
+REQUIRED_COLUMNS = ("title", "author")
+
+
+def _problems(frame, mask, column, reason):
+    """Problem rows for one check, as a frame of line/column/value/reason."""
+    rows = frame.loc[mask]
+    return pd.DataFrame({
+        "line": rows["_line"],
+        "column": column,
+        "value": rows[column] if column in rows else "",
+        "reason": reason,
+    })
+
+
+def check_chunk(frame, seen_barcodes):
+    """
+    Run every column check over one chunk of rows (all values as strings) with
+    vectorized operations. Returns a list of problem frames and updates
+    seen_barcodes with this chunk's barcodes.
+    """
+    problems = []
+
+    for column in REQUIRED_COLUMNS:
+        if column not in frame:
+            problems.append(_problems(frame, pd.Series(True, index=frame.index), column, "missing column"))
+            continue
+        problems.append(_problems(frame, frame[column].str.strip() == "", column, f"{column} is required"))
+
+    for column, (low, high) in NUMERIC_RANGES.items():
+        if column not in frame:
+            continue
+        values = frame[column].str.strip()
+        present = values != ""
+        is_int = values.str.fullmatch(INTEGER_PATTERN)
+        problems.append(_problems(frame, present & ~is_int, column, "not an integer"))
+
+        numbers = pd.to_numeric(values.where(present & is_int), errors="coerce")
+        out_of_range = pd.Series(False, index=frame.index)
+        if low is not None:
+            out_of_range |= numbers < low
+        if high is not None:
+            out_of_range |= numbers > high
+        problems.append(_problems(frame, out_of_range, column, "out of range"))
+
+    if "barcode" in frame:
+        barcodes = frame["barcode"].str.strip()
+        present = barcodes != ""
+        duplicated = present & (barcodes.duplicated() | barcodes.isin(seen_barcodes))
+        problems.append(_problems(frame, duplicated, "barcode", "duplicate barcode in file"))
+
+        fresh = barcodes[present & ~duplicated]
+        seen_barcodes.update(fresh)
+        existing = set(
+            BookCopy._get_collection().distinct("barcode", {"barcode": {"$in": fresh.tolist()}})
+        ) if len(fresh) else set()
+        problems.append(_problems(frame, barcodes.isin(existing) & ~duplicated, "barcode", "barcode already exists"))
+
+    return [p for p in problems if len(p)]
+
+
+def validate_csv(path, chunk_rows=VALIDATION_CHUNK_ROWS):
+    """
+    Pre-validate a spooled catalog CSV without writing anything.
+
+    The file is read into columnar string frames VALIDATION_CHUNK_ROWS at a
+    time; type and range checks, in-file barcode duplicates and one $in
+    lookup against BookCopy.barcode run per chunk. Line numbers count the
+    header as line 1 and assume one record per line, as plan_shards does.
+    """
+    started = time.time()
+    seen_barcodes = set()
+    rows = 0
+    invalid_lines = set()
+    by_reason = {}
+    sample = []
+
+    reader = pd.read_csv(
+        path, dtype=str, keep_default_na=False, chunksize=chunk_rows,
+        encoding="utf-8-sig", skipinitialspace=False,
+    )
+    try:
+        for frame in reader:
+            frame["_line"] = frame.index + 2
+            rows += len(frame)
+            for problems in check_chunk(frame, seen_barcodes):
+                invalid_lines.update(problems["line"].tolist())
+                for (column, reason), count in problems.groupby(["column", "reason"]).size().items():
+                    key = f"{column}: {reason}"
+                    by_reason[key] = by_reason.get(key, 0) + int(count)
+                if len(sample) < ERROR_SAMPLE_SIZE:
+                    sample.extend(problems.head(ERROR_SAMPLE_SIZE - len(sample)).to_dict("records"))
+    except pd.errors.ParserError as e:
+        # Structurally broken CSV (e.g. a row with too many fields): report where it stopped
+        by_reason["file: malformed CSV"] = 1
+        sample.append({"line": rows + 2, "column": "", "value": "", "reason": str(e)})
+
+    sample.sort(key=lambda p: p["line"])
+    return {
+        "rows": rows,
+        "valid": rows - len(invalid_lines),
+        "invalid": len(invalid_lines),
+        "problems": by_reason,
+        "sample": [{**p, "line": int(p["line"])} for p in sample],
+        "seconds": round(time.time() - started, 2),
+    }
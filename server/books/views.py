@@ -1,8 +1,9 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from mongoengine import DoesNotExist, ValidationError
 from .models import Book, BookCopy
 import json
+import os
 from datetime import datetime
 from backend.utils.permissions import require_role
 from mongoengine.queryset.visitor import Q
@@ -12,10 +13,28 @@ from rest_framework.response import Response
 from rest_framework import status
 from celery.result import AsyncResult
 from backend.utils.redis_client import redis_client
-from books.task import process_bulk_upload
+from books.task import process_bulk_upload, validate_bulk_upload
+from books.ingest import spool_upload, spool_path, errors_path
+from books.progress import summarize_upload_progress, stream_upload_progress
+from books.shelves import get_homepage_shelves, invalidate_homepage_shelves
 from borrow.models import BorrowRecord
+from borrow.snapshots import queue_snapshot_sync
+from backend.utils.pagination import keyset_paginate, cursor_from_item
+from backend.utils.json_utils import lean
+from backend.utils.prefetch import prefetch_related
+from backend.utils.export import export_response, export_options
+from bson import ObjectId
+from bson.errors import InvalidId
 import uuid
 
+BOOK_SORT = "-created_at,-id"
+COPY_SORT = "-added_at,-id"
+
+# Per-endpoint projections for the lean read path (sort keys included for cursors)
+BOOK_LIST_FIELDS = ("id", "title", "author", "category", "language", "cover_image_url", "related_books", "created_at")
+COPY_LIST_FIELDS = ("id", "book", "barcode", "vendor", "condition", "is_available", "is_damaged",
+                    "remarks", "added_at", "last_borrowed_at")
+
 # -----------------------------------
 # Helper function for parsing JSON safely
 # -----------------------------------
@@ -69,6 +88,7 @@ def create_book(request):
             waitlist=data.get("waitlist", []),
         )
         book.save()
+        invalidate_homepage_shelves()
         return JsonResponse({
             "message": "Book created successfully",
             "id": str(book.id)
@@ -84,7 +104,10 @@ def list_books(request):
     Production-ready book listing API:
     - Full-text search
     - Faceted filtering (category, author, price, published_year)
-    - Cursor-based pagination (optional)
+    - Keyset pagination on (created_at, id) when page_size is given:
+      pass ?cursor= (or the legacy ?last_id=); the next/prev cursors and the
+      optional count (?count=exact|estimated) are returned in X-* headers.
+      Paged search results follow the same order instead of text relevance.
     - Ready for recommendation integration
     """
     if request.method != "GET":
@@ -114,64 +137,69 @@ def list_books(request):
         books = Book.objects(**query).search_text(search_text).order_by("$text_score")
     else:
         books = Book.objects(**query).order_by("-created_at")
+    books = lean(books, *BOOK_LIST_FIELDS)
 
     # -----------------------------
-    # Cursor-based Pagination (optional)
+    # Keyset Pagination (optional)
     # -----------------------------
+    page = None
     page_size = request.GET.get("page_size")
-    last_id = request.GET.get("last_id")  # cursor for pagination
     if page_size:  # only apply pagination if page_size is provided
-        page_size = int(page_size)
-        if last_id:
-            books = books.filter(id__lt=last_id)
-        books = books[:page_size]  # slice for pagination
+        cursor = request.GET.get("cursor")
+        last_id = request.GET.get("last_id")  # legacy cursor: id of the last book seen
+        if not cursor and last_id:
+            if not ObjectId.is_valid(last_id):
+                return JsonResponse({"error": "Invalid last_id"}, status=400)
+            last_book = Book.objects(id=last_id).only("created_at").first()
+            if last_book:
+                cursor = cursor_from_item(last_book, BOOK_SORT)
+        try:
+            page = keyset_paginate(
+                books, BOOK_SORT, int(page_size),
+                cursor=cursor,
+                count_mode=request.GET.get("count", "none"),
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        books = page["items"]
 
     # -----------------------------
     # Response
     # -----------------------------
     result = [
         {
-            "id": str(b.id),
-            "title": b.title,
-            "author": b.author,
-            "category": b.category,
-            "language": b.language,
-            "cover_image_url": b.cover_image_url,
-            "related_books": b.related_books,  # placeholder for recommendations
+            "id": str(b["_id"]),
+            "title": b.get("title"),
+            "author": b.get("author"),
+            "category": b.get("category"),
+            "language": b.get("language"),
+            "cover_image_url": b.get("cover_image_url"),
+            "related_books": [str(r) for r in b.get("related_books") or []],  # placeholder for recommendations
         }
         for b in books
     ]
 
-    return JsonResponse(result, safe=False)
+    response = JsonResponse(result, safe=False)
+    if page:
+        if page["next_cursor"]:
+            response["X-Next-Cursor"] = page["next_cursor"]
+        if page["prev_cursor"]:
+            response["X-Prev-Cursor"] = page["prev_cursor"]
+        if "total" in page:
+            response["X-Total-Count"] = str(page["total"])
+    return response
 
 @csrf_exempt
 def homepage_books(request):
     """
     Netflix-style homepage API:
     - Returns categories with a few top books per category
+    - Served from a cached snapshot built from one indexed query per shelf (see books/shelves.py)
     """
     if request.method != "GET":
         return JsonResponse({"error": "Invalid HTTP method"}, status=405)
 
-    # Get top categories (later, can be recommendation-driven)
-    categories = Book.objects.distinct("category")[:10]
-
-    result = {}
-    for cat in categories:
-        books = Book.objects(category__icontains=cat).order_by("-created_at")[:10]
-        result[cat] = [
-            {
-                "id": str(b.id),
-                "title": b.title,
-                "author": b.author,
-                "category": b.category,
-                "cover_image_url": b.cover_image_url,
-                "related_books": getattr(b, "related_books", []),
-            }
-            for b in books
-        ]
-    print(result)
-    return JsonResponse(result)
+    return JsonResponse(get_homepage_shelves())
 
 
 @csrf_exempt
@@ -230,6 +258,9 @@ def update_book(request, book_id):
         updates = {field: data[field] for field in updatable_fields if field in data}
         if updates:
             book.update(**updates)
+            invalidate_homepage_shelves()
+            if "title" in updates and updates["title"] != book.title:
+                queue_snapshot_sync("book", book.id, {"book_title": updates["title"]})
 
         return JsonResponse({"message": "Book updated successfully"})
 
@@ -249,6 +280,7 @@ def delete_book(request, book_id):
     try:
         book = Book.objects.get(id=book_id)
         book.delete()
+        invalidate_homepage_shelves()
         return JsonResponse({"message": "Book deleted successfully"})
     except DoesNotExist:
         return JsonResponse({"error": "Book not found"}, status=404)
@@ -293,6 +325,93 @@ def create_book_copy(request):
     return JsonResponse({"error": "Invalid HTTP method"}, status=405)
 
 
+MAX_BULK_COPIES = int(os.getenv("MAX_BULK_COPIES", 5000))
+
+
+def barcodes_from_request(data):
+    """
+    Barcodes for bulk provisioning, either listed explicitly
+    ({"barcodes": [...]}) or generated from a range
+    ({"prefix": "LIB-", "start": 1, "end": 300, "pad": 4} -> LIB-0001 .. LIB-0300).
+    Raises ValueError for malformed input.
+    """
+    if data.get("barcodes") is not None:
+        barcodes = data["barcodes"]
+        if not isinstance(barcodes, list) or not all(isinstance(b, str) and b.strip() for b in barcodes):
+            raise ValueError("barcodes must be a list of non-empty strings")
+        return [b.strip() for b in barcodes]
+
+    try:
+        start, end = int(data["start"]), int(data["end"])
+        pad = int(data.get("pad") or 0)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Provide either barcodes or prefix with integer start and end")
+    if start < 0 or end < start:
+        raise ValueError("end must be greater than or equal to start")
+    if end - start + 1 > MAX_BULK_COPIES:
+        raise ValueError(f"At most {MAX_BULK_COPIES} copies per request")
+    prefix = data.get("prefix") or ""
+    return [f"{prefix}{n:0{pad}d}" for n in range(start, end + 1)]
+
+
+@require_role('admin','librarian')
+@csrf_exempt
+def bulk_create_book_copies(request):
+    """
+    Create many copies of one book in a single request: one insert_many and
+    one $inc on the Book counters. Barcodes that already exist (or repeat in
+    the request) are reported under "failed"; the rest are still created.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid HTTP method"}, status=405)
+
+    data = parse_json(request)
+    if not data:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    try:
+        book = Book.objects.only("id").get(id=data.get("book_id"))
+    except (DoesNotExist, ValidationError):
+        return JsonResponse({"error": "Book not found"}, status=404)
+
+    try:
+        barcodes = barcodes_from_request(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if not barcodes:
+        return JsonResponse({"error": "No barcodes given"}, status=400)
+    if len(barcodes) > MAX_BULK_COPIES:
+        return JsonResponse({"error": f"At most {MAX_BULK_COPIES} copies per request"}, status=400)
+
+    fields = {
+        "condition": data.get("condition") or "Good",
+        "vendor": data.get("vendor"),
+        "remarks": data.get("remarks"),
+    }
+    try:
+        # Field rules are checked once on a sample copy; the insert itself is raw
+        BookCopy(book=book, barcode=barcodes[0], **fields).validate()
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    unique, failed, seen = [], [], set()
+    for barcode in barcodes:
+        if barcode in seen:
+            failed.append({"barcode": barcode, "error": "Duplicate barcode in request"})
+        else:
+            seen.add(barcode)
+            unique.append(barcode)
+
+    created, rejected = BookCopy.bulk_create(book.id, unique, **fields)
+    failed.extend(rejected)
+
+    return JsonResponse({
+        "message": f"{len(created)} book copies created",
+        "book_id": str(book.id),
+        "created": len(created),
+        "failed": failed,
+    }, status=201 if created else 400)
+
 
 @csrf_exempt
 
@@ -302,8 +421,9 @@ def list_book_copies(request):
     Advanced BookCopy listing API:
     - Full-text search (barcode, vendor)
     - Faceted filtering (availability, damage, condition)
-    - Pagination
-    - Returns counts and items
+    - Keyset pagination on (added_at, id) via ?cursor=; ?page= still works
+      but skips rows, so deep pages should follow next_cursor instead
+    - Returns counts (?count=exact|estimated|none, default exact) and items
     """
     if request.method != "GET":
         return JsonResponse({"error": "Invalid HTTP method"}, status=405)
@@ -337,10 +457,10 @@ def list_book_copies(request):
     print("Search Text:", search_text)
     if search_text:
         # Use MongoDB’s text search (requires the text index you defined)
-        copies = BookCopy.objects.search_text(search_text).filter(query).order_by("$text_score", "-added_at")
-        print("Search Results:", copies)
+        copies = BookCopy.objects.search_text(search_text).filter(query)
     else:
-        copies = BookCopy.objects(query).order_by("-added_at")
+        copies = BookCopy.objects(query)
+    copies = lean(copies, *COPY_LIST_FIELDS)
 
     # ----------------------------------------
     # 📄 Pagination
@@ -348,37 +468,52 @@ def list_book_copies(request):
     page = int(request.GET.get("page", 1))
     page_size = int(request.GET.get("page_size", 10))
 
-    total = copies.count()
-    start = (page - 1) * page_size
-    end = start + page_size
-    copies = copies[start:end]
+    try:
+        paginated = keyset_paginate(
+            copies, COPY_SORT, page_size,
+            cursor=request.GET.get("cursor"),
+            count_mode=request.GET.get("count", "exact"),
+            page=page,
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    copies = paginated["items"]
+    total = paginated.get("total")
 
     # ----------------------------------------
     # 📦 Response Data
     # ----------------------------------------
+    # Fetch the page's books once instead of dereferencing each copy
+    prefetch_related(copies, {"book": (Book, ("title", "author", "category"))})
+
     result = []
     for c in copies:
+        book = c["book"]
         result.append({
-            "id": str(c.id),
-            "barcode": c.barcode,
-            "vendor": c.vendor,
-            "condition": c.condition,
-            "is_available": c.is_available,
-            "is_damaged": c.is_damaged,
-            "remarks": c.remarks,
-            "added_at": c.added_at.isoformat(),
-            "last_borrowed_at": c.last_borrowed_at.isoformat() if c.last_borrowed_at else None,
-            "book_id": str(c.book.id) if c.book else None,
-            "book_title": c.book.title if c.book else None,
-            "book_author": c.book.author if c.book else None,
-            "book_category": c.book.category if c.book else None,
+            "id": str(c["_id"]),
+            "barcode": c.get("barcode"),
+            "vendor": c.get("vendor"),
+            "condition": c.get("condition"),
+            "is_available": c.get("is_available"),
+            "is_damaged": c.get("is_damaged"),
+            "remarks": c.get("remarks"),
+            "added_at": c["added_at"].isoformat() if c.get("added_at") else None,
+            "last_borrowed_at": c["last_borrowed_at"].isoformat() if c.get("last_borrowed_at") else None,
+            "book_id": str(book["_id"]) if book else None,
+            "book_title": book.get("title") if book else None,
+            "book_author": book.get("author") if book else None,
+            "book_category": book.get("category") if book else None,
         })
 
     return JsonResponse({
         "items": result,
         "total": total,
-        "total_pages": (total + page_size - 1) // page_size,
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None,
         "current_page": page,
+        "next_cursor": paginated["next_cursor"],
+        "prev_cursor": paginated["prev_cursor"],
+        "has_next": paginated["has_next"],
+        "has_prev": paginated["has_prev"],
     })
 @csrf_exempt
 @api_view(["GET"])
@@ -441,6 +576,8 @@ def update_book_copy(request, copy_id):
             except DoesNotExist:
                 return JsonResponse({"error": "Book not found"}, status=404)
 
+        old_barcode = copy.barcode
+
         # Update all other fields dynamically
         for field, value in data.items():
             if hasattr(copy, field):
@@ -448,6 +585,8 @@ def update_book_copy(request, copy_id):
 
         try:
             copy.save()
+            if copy.barcode != old_barcode:
+                queue_snapshot_sync("copy", copy.id, {"barcode": copy.barcode})
             return JsonResponse({"message": "Book copy updated successfully"})
         except ValidationError as e:
             return JsonResponse({"error": str(e)}, status=400)
@@ -461,18 +600,9 @@ def delete_book_copy(request, copy_id):
     if request.method == "DELETE":
         try:
             copy = BookCopy.objects.get(id=copy_id)
-            book = copy.book  # Get the associated Book
-
-            # Decrement counts safely
-            if book.total_copies > 0:
-                book.total_copies -= 1
-
-            if copy.is_available and book.available_copies > 0:
-                book.available_copies -= 1
 
-            book.save()  # Save the updated counts
-
-            copy.delete()  # Delete the copy itself
+            # BookCopy.delete() decrements the Book counters atomically
+            copy.delete()
             return JsonResponse({"message": "Book copy deleted successfully"})
 
         except DoesNotExist:
@@ -494,7 +624,10 @@ import uuid
 def bulk_upload_books(request):
     """
     Allows admin to upload thousands of book records at once.
-    Runs in background using Celery.
+    The file is streamed to the spool directory and a Celery task is queued
+    with only its path, so the request returns as soon as the file is on disk.
+    With dry_run=true the file is only validated; the report appears under
+    "validation" in the progress endpoint and nothing is written.
     """
     file = request.FILES.get("file")
     if not file:
@@ -503,19 +636,23 @@ def bulk_upload_books(request):
     if not file.name.endswith(".csv"):
         return JsonResponse({"error": "Only CSV files are allowed"}, status=400)
 
-    csv_data = file.read().decode("utf-8")
     task_id = str(uuid.uuid4())
+    path = spool_upload(file, task_id)
 
     # Create a redis entry for progress
-    redis_client.hset(task_id, mapping={
+    redis_client.update_upload(task_id, {
         "status": "started",
         "processed": 0,
         "failed": 0,
         "progress": 0.0,
     })
 
+    if request.POST.get("dry_run", "").lower() in ("1", "true", "yes"):
+        validate_bulk_upload.delay(path, task_id)
+        return JsonResponse({"message": "Validation started", "task_id": task_id, "dry_run": True}, status=200)
+
     # Trigger background task
-    process_bulk_upload(csv_data, task_id)
+    process_bulk_upload.delay(path, task_id)
 
     return JsonResponse({"message": "Upload started", "task_id": task_id}, status=200)
 
@@ -526,7 +663,8 @@ def bulk_upload_books(request):
 @require_role('admin', 'librarian')
 def upload_progress(request, task_id):
     """
-    Returns progress info of an ongoing upload task.
+    Returns progress info of an ongoing upload task:
+    combined counters plus a per-shard breakdown under "shards".
     """
     progress = redis_client.hgetall(task_id)
     if not progress:
@@ -534,4 +672,108 @@ def upload_progress(request, task_id):
     
     # Decode redis byte values
     data = {k.decode(): v.decode() for k, v in progress.items()}
-    return JsonResponse(data, status=200)
+    return JsonResponse(summarize_upload_progress(data), status=200)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@require_role('admin', 'librarian')
+async def upload_progress_stream(request, task_id):
+    """
+    Push upload progress as server-sent events instead of polling
+    upload_progress. Runs as an async view under backend.asgi; each event
+    carries the same body upload_progress returns.
+    """
+    response = StreamingHttpResponse(stream_upload_progress(task_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@require_role('admin', 'librarian')
+def resume_upload(request, task_id):
+    """
+    Re-queue an interrupted upload. Shards pick up from their last checkpoint,
+    so only rows that were not committed yet are processed again.
+    Only a failed upload, or one whose workers stopped sending heartbeats,
+    can be resumed; a live job is left alone so no shard runs twice.
+    """
+    state = redis_client.hgetall(task_id)
+    if not state:
+        return JsonResponse({"error": "Invalid or expired task_id"}, status=404)
+    if state.get(b"status") == b"completed":
+        return JsonResponse({"error": "Upload already completed"}, status=400)
+
+    path = spool_path(task_id)
+    if not os.path.exists(path):
+        return JsonResponse({"error": "Spooled upload file no longer exists"}, status=410)
+
+    refused = redis_client.claim_upload_resume(task_id)
+    if refused:
+        return JsonResponse({"error": f"Upload is still {refused}; only failed or stalled uploads can be resumed"},
+                            status=409)
+    process_bulk_upload.delay(path, task_id)
+    return JsonResponse({"message": "Upload resumed", "task_id": task_id}, status=200)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@require_role('admin', 'librarian')
+def upload_errors(request, task_id):
+    """Download the rows that failed in a completed upload, with an "error" column."""
+    path = errors_path(task_id)
+    if not os.path.exists(path):
+        return JsonResponse({"error": "No error report for this task"}, status=404)
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=f"upload-{task_id}-errors.csv",
+                        content_type="text/csv")
+
+
+
+# -----------------------------------
+# Catalog exports (streamed)
+# -----------------------------------
+BOOK_EXPORT_FIELDS = ("title", "author", "category", "edition", "publisher", "published_year", "price",
+                      "location", "isbn", "language", "no_of_pages", "total_copies", "available_copies",
+                      "created_at")
+COPY_EXPORT_FIELDS = ("book", "barcode", "vendor", "condition", "is_available", "is_damaged", "remarks",
+                      "added_at", "last_borrowed_at")
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@require_role('admin', 'librarian')
+def export_books(request):
+    """
+    Stream the whole catalog as CSV or NDJSON (?format=csv|ndjson, ?gzip=1).
+    Optional ?category= filter.
+    """
+    fmt, gzip = export_options(request)
+    query = {}
+    if request.GET.get("category"):
+        query["category"] = request.GET["category"]
+    try:
+        return export_response(Book._get_collection(), BOOK_EXPORT_FIELDS, "books", query, fmt, gzip)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@require_role('admin', 'librarian')
+def export_book_copies(request):
+    """
+    Stream the copy inventory as CSV or NDJSON (?format=csv|ndjson, ?gzip=1).
+    Optional ?book_id= and ?is_available=true|false filters.
+    """
+    fmt, gzip = export_options(request)
+    query = {}
+    try:
+        if request.GET.get("book_id"):
+            query["book"] = ObjectId(request.GET["book_id"])
+        if request.GET.get("is_available"):
+            query["is_available"] = request.GET["is_available"].lower() == "true"
+        return export_response(BookCopy._get_collection(), COPY_EXPORT_FIELDS, "book_copies", query, fmt, gzip)
+    except (ValueError, InvalidId) as e:
+        return JsonResponse({"error": str(e)}, status=400)
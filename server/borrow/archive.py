@@ -0,0 +1,192 @@
+# borrow/archive.py
+import os
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from backend.utils.pagination import decode_cursor, keyset_filter, keyset_sort, keyset_result
+from borrow.models import BorrowRecord
+
+# Returned records whose return_date is older than this move out of the hot
+# BorrowRecord collection into monthly archive collections.
+ARCHIVE_AFTER_DAYS = int(os.getenv("BORROW_ARCHIVE_AFTER_DAYS", 365))
+ARCHIVE_BATCH_SIZE = int(os.getenv("BORROW_ARCHIVE_BATCH_SIZE", 5000))
+ARCHIVE_PREFIX = "borrow_record_archive_"  # + YYYYMM of borrow_date
+
+HISTORY_SORT = "-borrow_date,-id"
+DUPLICATE_KEY_ERROR = 11000
+
+
+# ----------------------
+# Partitions
+# ----------------------
+def archive_name(borrow_date):
+    return f"{ARCHIVE_PREFIX}{borrow_date:%Y%m}"
+
+
+def month_bounds(name):
+    """[start, end) of the borrow_date month held by an archive collection."""
+    start = datetime.strptime(name[len(ARCHIVE_PREFIX):], "%Y%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def archive_collections(db=None, newest_first=True):
+    """Names of the existing archive partitions, ordered by month."""
+    db = db if db is not None else BorrowRecord._get_collection().database
+    names = db.list_collection_names(filter={"name": {"$regex": f"^{ARCHIVE_PREFIX}\\d{{6}}$"}})
+    return sorted(names, reverse=newest_first)
+
+
+def with_archive(match=None, db=None):
+    """
+    Pipeline stages that $unionWith every archive partition (each filtered
+    by `match`), for all-time aggregations over BorrowRecord.
+    """
+    stages = [{"$match": match}] if match else []
+    return [
+        {"$unionWith": {"coll": name, "pipeline": stages}} if stages else {"$unionWith": name}
+        for name in archive_collections(db, newest_first=False)
+    ]
+
+
+def archived_count(match=None, db=None):
+    """Records matching `match` across the archive partitions."""
+    db = db if db is not None else BorrowRecord._get_collection().database
+    return sum(db[name].count_documents(match or {}) for name in archive_collections(db))
+
+
+def ensure_archive_indexes(collection):
+    # History pages are the only reads on the archive
+    collection.create_index([("user", ASCENDING), ("borrow_date", DESCENDING), ("_id", DESCENDING)])
+
+
+# ----------------------
+# Archiver
+# ----------------------
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move up to batch_size returned records with return_date < cutoff and no
+    fine still Pending into their monthly partitions: insert_many into the archive, then delete_many
+    from BorrowRecord. Safe to re-run after a crash between the two steps:
+    rows already in the archive are skipped as duplicates and then deleted.
+    Returns the number of records moved.
+    """
+    hot = BorrowRecord._get_collection()
+    rows = list(hot.find(
+        {"return_date": {"$lt": cutoff}, "returned": True, "fine_payment_status": {"$ne": "Pending"}},
+        sort=[("return_date", ASCENDING)], limit=batch_size,
+    ))
+    if not rows:
+        return 0
+
+    partitions = {}
+    for row in rows:
+        partitions.setdefault(archive_name(row["borrow_date"]), []).append(row)
+
+    db = hot.database
+    existing = set(archive_collections(db))
+    for name, batch in partitions.items():
+        archive = db[name]
+        if name not in existing:
+            ensure_archive_indexes(archive)
+        try:
+            archive.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            if any(err["code"] != DUPLICATE_KEY_ERROR for err in e.details.get("writeErrors", [])):
+                raise
+        hot.delete_many({
+            "_id": {"$in": [row["_id"] for row in batch]},
+            "returned": True,
+            "fine_payment_status": {"$ne": "Pending"},
+        })
+    return len(rows)
+
+
+def archive_returned(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """
+    Archive everything returned more than `days` ago, batch by batch.
+    `days` may not go below ARCHIVE_AFTER_DAYS: user_history relies on every
+    archived row being older than archive_horizon().
+    """
+    if days < ARCHIVE_AFTER_DAYS:
+        raise ValueError(f"days must be at least {ARCHIVE_AFTER_DAYS}")
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return {"moved": moved, "batches": batches, "cutoff": cutoff.isoformat()}
+
+
+# ----------------------
+# Hot + archive history
+# ----------------------
+def archive_horizon():
+    """Every archived row has a borrow_date before this."""
+    return datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+def _needs_archive(rows, wanted, values, backward):
+    """Whether archived rows could still sort into a page the hot rows started."""
+    horizon = archive_horizon()
+    if backward:
+        return values[0] < horizon  # prev pages hold rows newer than the cursor
+    return len(rows) < wanted or rows[wanted - 1]["borrow_date"] < horizon
+
+
+def _key(row):
+    return row["borrow_date"], row["_id"]
+
+
+def _reaches(name, bound, backward):
+    """Whether a partition may hold rows at or after `bound` (a borrow_date) in page order."""
+    start, end = month_bounds(name)
+    return start <= bound if not backward else end > bound
+
+
+def user_history(user_id, fields, limit, cursor=None, page=None, count=False):
+    """
+    Keyset page of a user's borrow records over the hot collection and the
+    archive partitions, newest first, with the same cursors as keyset_paginate.
+
+    The hot collection is read first. While its rows fill the page and are
+    newer than archive_horizon() the archive is not even listed; otherwise a
+    partition is only queried when it can hold rows that sort into the page,
+    so older pages read the few months they span. The total (count=True)
+    adds a count on every partition and is opt-in.
+    """
+    limit = max(int(limit), 1)
+    values, direction = decode_cursor(cursor) if cursor else (None, "next")
+    backward = direction == "prev"
+    skip = (int(page) - 1) * limit if values is None and page and int(page) > 1 else 0
+    wanted = skip + limit + 1
+
+    query = {"user": user_id}
+    if values is not None:
+        query = {"$and": [query, keyset_filter(HISTORY_SORT, values, backward)]}
+    projection = {f: 1 for f in fields if f != "id"}
+    sort = list(keyset_sort(HISTORY_SORT, backward).items())
+
+    hot = BorrowRecord._get_collection()
+    rows = list(hot.find(query, projection, sort=sort, limit=wanted))
+    names = []
+    if _needs_archive(rows, wanted, values, backward):
+        names = archive_collections(hot.database, newest_first=not backward)
+    for name in names:
+        if values is not None and not _reaches(name, values[0], backward):
+            continue  # entirely on the other side of the cursor
+        if len(rows) >= wanted and not _reaches(name, rows[wanted - 1]["borrow_date"], not backward):
+            break  # page already full with rows that sort before this month
+        rows.extend(hot.database[name].find(query, projection, sort=sort, limit=wanted))
+        rows.sort(key=_key, reverse=not backward)
+        del rows[wanted:]
+
+    result = keyset_result(rows[skip:], HISTORY_SORT, limit, values, backward, page)
+    if count:
+        result["total"] = hot.count_documents({"user": user_id}) + sum(
+            hot.database[name].count_documents({"user": user_id}) for name in archive_collections(hot.database)
+        )
+    return result
@@ -0,0 +1,436 @@
+# borrow/circulation.py
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne, ReturnDocument
+from books.models import Book, BookCopy
+from borrow.ledger import record_fines
+from borrow.models import BorrowRecord
+from users.models import User
+
+
+WAITLIST_SLICE_MAX = 1_000_000  # "rest of the list" for $slice in pipeline updates
+
+
+def borrow_settings():
+    return int(os.getenv("MAX_BORROW_LIMIT", 3)), int(os.getenv("BORROW_DAYS", 14))
+
+
+# -------------------------
+# Helper: Calculate Fine
+# -------------------------
+def calculate_fine(due_date, return_date=None):
+    if not return_date:
+        return_date = datetime.utcnow()
+    fine_per_day = float(os.getenv("FINE_PER_DAY", 5))
+    days_overdue = max(0, (return_date - due_date).days)
+    return days_overdue * fine_per_day
+
+
+def _object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+# -------------------------
+# Active-loan counter (User.active_loans)
+# -------------------------
+def reserve_loans(user_id, count, limit):
+    """
+    Add `count` to the user's active_loans only if the result stays within
+    `limit`; the check and the increment are one conditional $inc.
+    Users without the field yet get it seeded from their open BorrowRecords
+    first, so an unmigrated account cannot borrow past the limit.
+    Returns True when the loans were reserved.
+    """
+    if count <= 0:
+        return True
+    if count > limit:
+        return False
+    users = User._get_collection()
+    query = {"_id": user_id, "active_loans": {"$lte": limit - count}}
+    if users.update_one(query, {"$inc": {"active_loans": count}}).modified_count:
+        return True
+    if seed_active_loans(user_id):
+        return users.update_one(query, {"$inc": {"active_loans": count}}).modified_count == 1
+    return False
+
+
+def seed_active_loans(user_id):
+    """
+    Set active_loans from the open BorrowRecords when the user has no counter
+    yet. Returns True when the field was missing (and is now set).
+    """
+    open_loans = BorrowRecord._get_collection().count_documents({"user": user_id, "returned": False})
+    result = User._get_collection().update_one(
+        {"_id": user_id, "active_loans": {"$exists": False}},
+        {"$set": {"active_loans": open_loans}},
+    )
+    return result.matched_count == 1
+
+
+def release_loans(loans_by_user):
+    """Give back loans ({user_id: n}) with one bulk_write, never going below zero."""
+    ops = [
+        UpdateOne({"_id": user_id}, [{"$set": {"active_loans": {
+            "$max": [0, {"$subtract": [{"$ifNull": ["$active_loans", 0]}, n]}]
+        }}}])
+        for user_id, n in loans_by_user.items() if n
+    ]
+    if ops:
+        User._get_collection().bulk_write(ops, ordered=False)
+
+
+def reserve_up_to(user_id, wanted, limit, attempts=3):
+    """
+    Reserve as many of `wanted` loans as the limit allows; re-reads the
+    counter when a concurrent checkout got in first. Returns the number reserved.
+    """
+    for _ in range(attempts):
+        if wanted <= 0 or reserve_loans(user_id, wanted, limit):
+            return max(wanted, 0)
+        current = User._get_collection().find_one({"_id": user_id}, {"active_loans": 1}) or {}
+        wanted = min(wanted, limit - (current.get("active_loans") or 0))
+    return 0
+
+
+def resolve_copies(items):
+    """
+    Map each requested item (a copy id or a barcode) to its copy with one query.
+    Returns {item: raw copy dict or None}.
+    """
+    ids = {item: _object_id(item) for item in items}
+    clauses = [{"barcode": {"$in": list(items)}}]
+    if any(ids.values()):
+        clauses.append({"_id": {"$in": [oid for oid in ids.values() if oid]}})
+
+    by_id, by_barcode = {}, {}
+    for copy in BookCopy._get_collection().find(
+        {"$or": clauses}, {"book": 1, "barcode": 1, "is_available": 1, "is_damaged": 1}
+    ):
+        by_id[copy["_id"]] = copy
+        by_barcode[copy["barcode"]] = copy
+    return {item: by_id.get(ids[item]) or by_barcode.get(item) for item in items}
+
+
+def claim_copies(copy_ids, now):
+    """
+    Flip every still-available, undamaged copy in copy_ids to unavailable with
+    one update_many. Each call stamps its own checkout_token, so the copies this
+    call won can be told apart from ones a concurrent checkout took.
+    Returns (token, set of claimed _ids).
+    """
+    if not copy_ids:
+        return None, set()
+    token = ObjectId()
+    collection = BookCopy._get_collection()
+    result = collection.update_many(
+        {"_id": {"$in": copy_ids}, "is_available": True, "is_damaged": False},
+        {"$set": {"is_available": False, "last_borrowed_at": now, "checkout_token": token}},
+    )
+    if result.modified_count == len(copy_ids):
+        return token, set(copy_ids)
+    # Scoped to copy_ids so the _id index serves it; checkout_token is not indexed
+    claimed = collection.find({"_id": {"$in": copy_ids}, "checkout_token": token}, {"_id": 1})
+    return token, {c["_id"] for c in claimed}
+
+
+def snapshot_for(user, copy, titles):
+    """BorrowRecord snapshot fields for a checkout (see borrow.snapshots)."""
+    return {
+        "book_title": titles.get(copy["book"]),
+        "barcode": copy.get("barcode"),
+        "username": getattr(user, "username", None),
+        "user_email": getattr(user, "email", None),
+    }
+
+
+def book_titles(book_ids):
+    """{book_id: title} for the given books with one $in query."""
+    return {
+        b["_id"]: b.get("title")
+        for b in Book._get_collection().find({"_id": {"$in": list(set(book_ids))}}, {"title": 1})
+    }
+
+
+def release_copies(token, copy_ids):
+    """Compensation: make copies claimed under `token` available again."""
+    BookCopy._get_collection().update_many(
+        {"_id": {"$in": list(copy_ids)}, "checkout_token": token},
+        {"$set": {"is_available": True}, "$unset": {"checkout_token": ""}},
+    )
+
+
+def adjust_available(book_deltas):
+    """Apply aggregated available_copies deltas ({book_id: delta}) in one bulk_write."""
+    ops = [
+        UpdateOne({"_id": book_id}, {"$inc": {"available_copies": delta}})
+        for book_id, delta in book_deltas.items() if delta
+    ]
+    if ops:
+        Book._get_collection().bulk_write(ops, ordered=False)
+
+
+def batch_checkout(user, items):
+    """
+    Lend several copies to one member in a fixed number of round trips:
+    one copy lookup, one conditional active_loans reservation, one claim, one
+    insert_many for the BorrowRecords and one bulk_write for the Book counters.
+    Reserved loans that end up unused are released again.
+
+    Items are copy ids or barcodes. Returns (results, due_date) with one result
+    per item, in request order.
+    """
+    max_limit, borrow_days = borrow_settings()
+    now = datetime.utcnow()
+    due_date = now + timedelta(days=borrow_days)
+
+    copies = resolve_copies(items)
+    results, eligible, seen = [None] * len(items), [], set()
+    for i, item in enumerate(items):
+        copy = copies[item]
+        if copy is None:
+            results[i] = {"item": item, "status": "failed", "error": "Book copy not found."}
+        elif copy["_id"] in seen:
+            results[i] = {"item": item, "status": "failed", "error": "Duplicate item in request."}
+        elif not copy.get("is_available") or copy.get("is_damaged"):
+            results[i] = {"item": item, "status": "failed", "error": "Selected copy is not available."}
+        else:
+            seen.add(copy["_id"])
+            eligible.append((i, copy))
+
+    active = getattr(user, "active_loans", 0) or 0
+    reserved = reserve_up_to(user.id, min(len(eligible), max_limit - active), max_limit)
+    candidates = eligible[:reserved]
+    for i, _ in eligible[reserved:]:
+        results[i] = {"item": items[i], "status": "failed", "error": "User has reached borrow limit."}
+
+    token, claimed = claim_copies([copy["_id"] for _, copy in candidates], now)
+    won = [(i, copy) for i, copy in candidates if copy["_id"] in claimed]
+    for i, copy in candidates:
+        if copy["_id"] not in claimed:
+            results[i] = {"item": items[i], "status": "failed", "error": "Selected copy is not available."}
+
+    if won:
+        titles = book_titles(copy["book"] for _, copy in won)
+        records = [{
+            "user": user.id,
+            "book": copy["book"],
+            "copy": copy["_id"],
+            "borrow_date": now,
+            "due_date": due_date,
+            "returned": False,
+            "fine": 0.0,
+            "fine_payment_status": "Not Applicable",
+            "book_condition_on_return": "Good",
+            "remarks_on_return": "",
+            **snapshot_for(user, copy, titles),
+        } for _, copy in won]
+        try:
+            inserted = BorrowRecord._get_collection().insert_many(records).inserted_ids
+        except Exception:
+            release_copies(token, [copy["_id"] for _, copy in won])
+            release_loans({user.id: reserved})
+            raise
+        adjust_available({book_id: -n for book_id, n in Counter(copy["book"] for _, copy in won).items()})
+
+        for (i, copy), record_id in zip(won, inserted):
+            results[i] = {
+                "item": items[i],
+                "status": "borrowed",
+                "borrow_id": str(record_id),
+                "copy_id": str(copy["_id"]),
+                "book_id": str(copy["book"]),
+                "barcode": copy["barcode"],
+            }
+
+    release_loans({user.id: reserved - len(won)})
+    return results, due_date
+
+
+def batch_return(items, default_condition="Good"):
+    """
+    Check in many copies at once (e.g. the overnight book drop).
+
+    Items are {"barcode", "condition", "remarks", "fine_paid"} dicts. Every
+    active borrow is found with one $in query, fines are computed in one
+    pass, and records, copies, book counters, the borrowers' active_loans
+    and the fine ledger are each written with a single bulk write. Book
+    counters only grow by the copies this call actually put back on the shelf.
+    Returns one result per item, in request order.
+    """
+    now = datetime.utcnow()
+    barcodes = [item["barcode"] for item in items]
+
+    copies = {
+        c["barcode"]: c
+        for c in BookCopy._get_collection().find({"barcode": {"$in": barcodes}}, {"barcode": 1, "book": 1})
+    }
+    borrows = {
+        r["copy"]: r
+        for r in BorrowRecord._get_collection().find(
+            {"copy": {"$in": [c["_id"] for c in copies.values()]}, "returned": False},
+            {"copy": 1, "book": 1, "user": 1, "due_date": 1},
+        )
+    }
+
+    # Every value written below is derived here, before the first write
+    results, returns, seen = [None] * len(items), [], set()
+    record_sets, copy_sets = {}, {}
+    for i, item in enumerate(items):
+        copy = copies.get(item["barcode"])
+        record = borrows.get(copy["_id"]) if copy else None
+        if copy is None:
+            results[i] = {"barcode": item["barcode"], "status": "failed", "error": "Invalid barcode."}
+        elif copy["_id"] in seen:
+            results[i] = {"barcode": item["barcode"], "status": "failed", "error": "Duplicate barcode in request."}
+        elif record is None:
+            results[i] = {"barcode": item["barcode"], "status": "failed", "error": "No active borrow record found."}
+        else:
+            seen.add(copy["_id"])
+            condition = item.get("condition") or default_condition
+            fine = calculate_fine(record["due_date"], now)
+            if fine > 0:
+                status = "Paid" if item.get("fine_paid") else "Pending"
+            else:
+                status = "Not Applicable"
+            record_sets[i] = {
+                "returned": True,
+                "return_date": now,
+                "book_condition_on_return": condition,
+                "remarks_on_return": item.get("remarks") or "",
+                "fine": fine,
+                "fine_payment_status": status,
+            }
+            copy_sets[i] = {
+                "is_available": True,
+                "condition": condition,
+                "is_damaged": condition.lower() == "damaged",
+                "last_returned_at": now,
+            }
+            returns.append((i, item, copy, record, condition, fine, status))
+
+    if returns:
+        # Only records still open are closed, so a concurrent return is not counted twice
+        result = BorrowRecord._get_collection().bulk_write([
+            UpdateOne({"_id": record["_id"], "returned": False}, {"$set": record_sets[i]})
+            for i, _, _, record, _, _, _ in returns
+        ], ordered=False)
+        if result.modified_count != len(returns):
+            closed = {
+                r["_id"] for r in BorrowRecord._get_collection().find(
+                    {"_id": {"$in": [r[3]["_id"] for r in returns]}, "return_date": now}, {"_id": 1}
+                )
+            }
+            for entry in [r for r in returns if r[3]["_id"] not in closed]:
+                results[entry[0]] = {"barcode": entry[1]["barcode"], "status": "failed",
+                                     "error": "No active borrow record found."}
+            returns = [r for r in returns if r[3]["_id"] in closed]
+
+    if returns:
+        # Only copies still out go back on the shelf, stamped so the ones this
+        # call flipped can be told apart from copies already made available
+        copies_result = BookCopy._get_collection().bulk_write([
+            UpdateOne({"_id": copy["_id"], "is_available": False}, {"$set": copy_sets[i]})
+            for i, _, copy, _, _, _, _ in returns
+        ], ordered=False)
+        if copies_result.modified_count == len(returns):
+            shelved = returns
+        else:
+            flipped = {
+                c["_id"] for c in BookCopy._get_collection().find(
+                    {"_id": {"$in": [r[2]["_id"] for r in returns]}, "last_returned_at": now}, {"_id": 1}
+                )
+            }
+            shelved = [r for r in returns if r[2]["_id"] in flipped]
+        release_loans(Counter(record["user"] for _, _, _, record, _, _, _ in returns))
+        record_fines([
+            (record["user"], record["_id"], fine, status == "Paid")
+            for _, _, _, record, _, fine, status in returns if fine > 0
+        ])
+
+        # One pipeline update per book: add the returned copies back and move
+        # the waitlist forward by the same number of places
+        per_book = Counter(record["book"] for _, _, _, record, _, _, _ in shelved)
+        Book._get_collection().bulk_write([
+            UpdateOne({"_id": book_id}, [{"$set": {
+                "available_copies": {"$add": [{"$ifNull": ["$available_copies", 0]}, n]},
+                "waitlist": {"$slice": [{"$ifNull": ["$waitlist", []]}, n, WAITLIST_SLICE_MAX]},
+            }}])
+            for book_id, n in per_book.items()
+        ], ordered=False)
+
+        for i, item, _, record, _, fine, status in returns:
+            results[i] = {
+                "barcode": item["barcode"],
+                "status": "returned",
+                "borrow_id": str(record["_id"]),
+                "fine": fine,
+                "fine_payment_status": status,
+            }
+
+    return results
+
+
+def claim_copy(now, copy_id=None, book_id=None):
+    """
+    Atomically take one copy off the shelf: a specific copy when copy_id is
+    given, otherwise any available copy of book_id. The availability check and
+    the flip happen in one find_one_and_update, so two desks scanning the same
+    copy can never both win. Returns the claimed copy (raw dict) or None.
+    """
+    query = {"is_available": True, "is_damaged": False}
+    if copy_id is not None:
+        query["_id"] = copy_id
+    else:
+        query["book"] = book_id
+    return BookCopy._get_collection().find_one_and_update(
+        query,
+        {"$set": {"is_available": False, "last_borrowed_at": now, "checkout_token": ObjectId()}},
+        projection={"book": 1, "barcode": 1, "checkout_token": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def checkout_copy(user, copy_id=None, book_id=None):
+    """
+    Lend one copy to `user`: claim the copy, insert the BorrowRecord, then
+    decrement the book's available_copies. If the record cannot be written the
+    claim is released again (compensation instead of a multi-document
+    transaction, which a standalone mongod does not support).
+
+    Returns (record, copy, due_date); record is None when no copy could be claimed.
+    """
+    _, borrow_days = borrow_settings()
+    now = datetime.utcnow()
+    due_date = now + timedelta(days=borrow_days)
+
+    copy = claim_copy(now, copy_id=copy_id, book_id=book_id)
+    if copy is None:
+        return None, None, due_date
+
+    titles = book_titles([copy["book"]])
+    record = {
+        "user": user.id,
+        "book": copy["book"],
+        "copy": copy["_id"],
+        "borrow_date": now,
+        "due_date": due_date,
+        "returned": False,
+        "fine": 0.0,
+        "fine_payment_status": "Not Applicable",
+        "book_condition_on_return": "Good",
+        "remarks_on_return": "",
+        **snapshot_for(user, copy, titles),
+    }
+    try:
+        record["_id"] = BorrowRecord._get_collection().insert_one(record).inserted_id
+    except Exception:
+        release_copies(copy["checkout_token"], [copy["_id"]])
+        raise
+    Book.adjust_counters(copy["book"], available=-1)
+    return record, copy, due_date
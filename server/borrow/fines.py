@@ -0,0 +1,38 @@
+# borrow/fines.py
+import os
+from datetime import datetime, timedelta
+from borrow.models import BorrowRecord
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def accrued_fine_expression(now, fine_per_day):
+    """
+    Server-side calculate_fine(due_date, now): whole days overdue (floor of the
+    millisecond difference, like timedelta.days) times fine_per_day.
+    """
+    return {"$multiply": [
+        {"$floor": {"$divide": [{"$subtract": [now, "$due_date"]}, DAY_MS]}},
+        fine_per_day,
+    ]}
+
+
+def materialize_fines(now=None):
+    """
+    Store the accrued fine on every active loan that is at least a day overdue,
+    in one update_many with a pipeline update (a single server-side pass over
+    the ("returned", "due_date") index). Loans under a day late owe nothing yet
+    and are left alone, so every matched record gets fine > 0 and "Pending".
+    return_book still computes the final fine when the book comes back.
+    """
+    now = now or datetime.utcnow()
+    fine_per_day = float(os.getenv("FINE_PER_DAY", 5))
+    result = BorrowRecord._get_collection().update_many(
+        {"returned": False, "due_date": {"$lte": now - timedelta(days=1)}},
+        [{"$set": {
+            "fine": accrued_fine_expression(now, fine_per_day),
+            "fine_payment_status": "Pending",
+            "fine_accrued_at": now,
+        }}],
+    )
+    return {"matched": result.matched_count, "updated": result.modified_count, "as_of": now.isoformat()}
@@ -0,0 +1,146 @@
+# borrow/ledger.py
+from collections import defaultdict
+from datetime import datetime
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from backend.utils.principal_cache import principal_cache
+from borrow.models import BorrowRecord, FineLedgerEntry
+from users.models import User
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _money(value):
+    return round(float(value), 2)
+
+
+def _apply(deltas):
+    """$inc fine_balance for {user_id: delta} with one bulk_write."""
+    ops = [UpdateOne({"_id": user_id}, {"$inc": {"fine_balance": _money(delta)}})
+           for user_id, delta in deltas.items() if delta]
+    if ops:
+        User._get_collection().bulk_write(ops, ordered=False)
+        for user_id in deltas:
+            principal_cache.invalidate(user_id)
+
+
+def current_balance(user_id):
+    """Stored fine_balance of a user, read past any cached principal."""
+    user = User._get_collection().find_one({"_id": user_id}, {"fine_balance": 1}) or {}
+    return user.get("fine_balance") or 0.0
+
+
+def _insert(entries):
+    """insert_many that skips duplicate keys; returns the indexes of the skipped entries."""
+    if not entries:
+        return set()
+    try:
+        FineLedgerEntry._get_collection().insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err["code"] != DUPLICATE_KEY_ERROR for err in errors):
+            raise
+        return {err["index"] for err in errors}
+    return set()
+
+
+def record_fines(fines, recorded_by=None):
+    """
+    Charge final fines to the ledger. `fines` is a list of
+    (user_id, borrow_id, amount, paid) tuples; fines paid at the desk get a
+    matching payment entry so the balance is unchanged.
+
+    Entries are written first and each user's balance then moves by the sum
+    of the entries that were actually inserted. The unique (borrow, kind)
+    index drops a fine already charged for the same loan, so retries do not
+    double-charge; payments are only written for the fines that were, so a
+    retry does not credit the desk payment twice either. A crash between
+    the steps leaves the balance behind the ledger until
+    reconcile_fine_balances rebuilds it from the entries.
+    """
+    now = datetime.utcnow()
+    charges, payments = [], []
+    for user_id, borrow_id, amount, paid in fines:
+        if amount <= 0:
+            continue
+        charges.append({"user": user_id, "borrow": borrow_id, "kind": "fine", "amount": _money(amount),
+                        "note": "", "recorded_by": recorded_by, "created_at": now})
+        payments.append({"user": user_id, "borrow": borrow_id, "kind": "payment", "amount": -_money(amount),
+                         "note": "Paid at return", "recorded_by": recorded_by, "created_at": now} if paid else None)
+    if not charges:
+        return 0
+
+    skipped = _insert(charges)
+    charged = [entry for i, entry in enumerate(charges) if i not in skipped]
+    payments = [entry for i, entry in enumerate(payments) if entry and i not in skipped]
+    _insert(payments)
+
+    deltas = defaultdict(float)
+    for entry in charged + payments:
+        deltas[entry["user"]] += entry["amount"]
+    _apply(deltas)
+    return len(charged) + len(payments)
+
+
+def record_fine(user_id, borrow_id, amount, paid=False, recorded_by=None):
+    return record_fines([(user_id, borrow_id, amount, paid)], recorded_by)
+
+
+def settle_records(user_id, amount, borrow_id=None):
+    """
+    Mark Pending fines as Paid, oldest return first, while `amount` covers
+    them (or just `borrow_id` when given). Returns the settled borrow ids.
+    """
+    query = {"user": user_id, "returned": True, "fine_payment_status": "Pending"}
+    if borrow_id:
+        query["_id"] = borrow_id
+    settled, remaining = [], _money(amount)
+    for record in BorrowRecord._get_collection().find(query, {"fine": 1}, sort=[("return_date", ASCENDING)]):
+        fine = _money(record.get("fine") or 0)
+        if fine > remaining:
+            break
+        remaining = _money(remaining - fine)
+        settled.append(record["_id"])
+    if settled:
+        BorrowRecord._get_collection().update_many(
+            {"_id": {"$in": settled}, "fine_payment_status": "Pending"},
+            {"$set": {"fine_payment_status": "Paid"}},
+        )
+    return settled
+
+
+def record_payment(user_id, amount, borrow_id=None, note="", recorded_by=None):
+    """
+    Take a payment off the user's balance. The balance check and the decrement
+    are one conditional $inc, so concurrent payments cannot overdraw it; the
+    ledger entry is written after it (and the $inc undone if that fails).
+    Returns (entry, new_balance, settled_borrow_ids), or None when the amount
+    exceeds the balance. Users without the field yet owe nothing until
+    reconcile_fine_balances has backfilled it.
+    """
+    amount = _money(amount)
+    user = User._get_collection().find_one_and_update(
+        {"_id": user_id, "fine_balance": {"$gte": amount}},
+        {"$inc": {"fine_balance": -amount}},
+        projection={"fine_balance": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if user is None:
+        return None
+    principal_cache.invalidate(user_id)
+    try:
+        entry = FineLedgerEntry(
+            user=user_id, borrow=borrow_id, kind="payment", amount=-amount,
+            note=note, recorded_by=recorded_by,
+        ).save()
+    except Exception:
+        _apply({user_id: amount})
+        raise
+    return entry, user["fine_balance"], settle_records(user_id, amount, borrow_id)
+
+
+def statement(user_id, limit=20):
+    """Latest ledger entries of a user, newest first."""
+    return list(FineLedgerEntry._get_collection().find(
+        {"user": user_id}, {"user": 0}, sort=[("created_at", -1)], limit=limit,
+    ))
@@ -0,0 +1,33 @@
+# borrow/management/commands/backfill_borrow_snapshots.py
+import time
+from django.core.management.base import BaseCommand
+from borrow.models import BorrowRecord
+from borrow.snapshots import SNAPSHOT_FIELDS, fill_snapshots, backfill_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill book_title / barcode / username / user_email on BorrowRecords written before "
+        "snapshots existed. Works in _id order, one $in per reference and one bulk_write per batch; "
+        "safe to interrupt and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        collection = BorrowRecord._get_collection()
+        missing = {"$or": [{field: {"$exists": False}} for field in SNAPSHOT_FIELDS]}
+        projection = {"book": 1, "copy": 1, "user": 1, **{f: 1 for f in SNAPSHOT_FIELDS}}
+
+        start, last_id, total = time.perf_counter(), None, 0
+        while True:
+            query = missing if last_id is None else {"$and": [missing, {"_id": {"$gt": last_id}}]}
+            rows = list(collection.find(query, projection).sort("_id", 1).limit(options["batch_size"]))
+            if not rows:
+                break
+            last_id = rows[-1]["_id"]
+            total += backfill_batch(fill_snapshots(rows))
+            self.stdout.write(f"{total} records backfilled ({total / (time.perf_counter() - start):.0f}/s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} records backfilled"))
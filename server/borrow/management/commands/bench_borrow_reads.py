@@ -0,0 +1,138 @@
+# borrow/management/commands/bench_borrow_reads.py
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from backend.utils.pagination import keyset_paginate, keyset_aggregate
+from books.models import Book, BookCopy
+from borrow.models import BorrowRecord
+from borrow.read_model import BORROW_LOOKUP_STAGES, borrow_match
+from users.models import User
+
+SORT = "-borrow_date,-id"
+SEED_MARKER = "__borrow_read_bench__"
+
+
+def legacy_page(match, limit, cursor):
+    """The old read path: keyset page of documents, then one lookup per reference type."""
+    paginated = keyset_paginate(BorrowRecord.objects(__raw__=match), SORT, limit, cursor=cursor)
+    rows = paginated["items"]
+    books = {b.id: b.title for b in Book.objects(id__in=[r._data["book"].id for r in rows]).only("title")}
+    copies = {c.id: c.barcode for c in BookCopy.objects(id__in=[r._data["copy"].id for r in rows]).only("barcode")}
+    users = {u.id: u.username for u in User.objects(id__in=[r._data["user"].id for r in rows]).only("username")}
+    paginated["items"] = [
+        (r.id, books.get(r._data["book"].id), copies.get(r._data["copy"].id), users.get(r._data["user"].id))
+        for r in rows
+    ]
+    return paginated
+
+
+def aggregate_page(match, limit, cursor):
+    return keyset_aggregate(BorrowRecord._get_collection(), match, SORT, limit, cursor, BORROW_LOOKUP_STAGES)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the legacy borrow listing reads (keyset page + per-reference lookups) with the "
+        "single $lookup aggregation, over several pages of list_borrows and search_borrows filters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=1_000_000,
+                            help="synthetic records to insert first (removed afterwards); 0 uses existing data")
+        parser.add_argument("--pages", type=int, default=5, help="pages walked per query")
+        parser.add_argument("--limit", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        BorrowRecord.ensure_indexes()
+        seeded = None
+        if options["records"]:
+            self.stdout.write(f"Seeding {options['records']} records...")
+            seeded = self._seed(options["records"])
+        try:
+            sample = BorrowRecord._get_collection().find_one({}, {"user": 1, "username": 1, "barcode": 1})
+            if not sample:
+                self.stdout.write("BorrowRecord is empty; use --records N")
+                return
+            now = datetime.utcnow()
+            queries = [
+                ("list", borrow_match(now)),
+                ("list ?status=active", borrow_match(now, status="active")),
+                ("list ?user_id", borrow_match(now, user_id=str(sample["user"]))),
+                ("search ?username", borrow_match(now, username=sample.get("username"))),
+                ("search ?barcode", borrow_match(now, barcode=sample.get("barcode"))),
+            ]
+
+            self.stdout.write(f"{'query':<22} {'path':<10} {'p50 ms':>8} {'p95 ms':>8} {'rows':>6}")
+            for name, match in queries:
+                for label, fetch in (("legacy", legacy_page), ("aggregate", aggregate_page)):
+                    timings, rows = [], 0
+                    for _ in range(options["repeat"]):
+                        cursor, rows = None, 0
+                        for _ in range(options["pages"]):
+                            start = time.perf_counter()
+                            paginated = fetch(match, options["limit"], cursor)
+                            timings.append((time.perf_counter() - start) * 1000)
+                            rows += len(paginated["items"])
+                            cursor = paginated["next_cursor"]
+                            if not cursor:
+                                break
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    self.stdout.write(
+                        f"{name:<22} {label:<10} {statistics.median(timings):>8.2f} {p95:>8.2f} {rows:>6}"
+                    )
+        finally:
+            if seeded:
+                self._cleanup(*seeded)
+
+    def _seed(self, count, batch_size=10000):
+        users = [{"_id": ObjectId(), "username": f"bench_user_{i}", "email": f"bench_user_{i}@example.com",
+                  "password": SEED_MARKER, "role": "member"} for i in range(max(1, count // 50))]
+        books = [{"_id": ObjectId(), "title": f"Bench Book {i}", "isbn": f"{SEED_MARKER}{i}"}
+                 for i in range(max(1, count // 20))]
+        User._get_collection().insert_many(users, ordered=False)
+        Book._get_collection().insert_many(books, ordered=False)
+
+        records, copies = BorrowRecord._get_collection(), BookCopy._get_collection()
+        now = datetime.utcnow()
+        copy_batch, record_batch = [], []
+        for i in range(count):
+            user, book = random.choice(users), random.choice(books)
+            copy = {"_id": ObjectId(), "book": book["_id"], "barcode": f"BENCH-{i}", "remarks": SEED_MARKER}
+            borrowed = now - timedelta(days=random.randint(0, 730), minutes=i % 1440)
+            returned = random.random() < 0.8
+            copy_batch.append(copy)
+            record_batch.append({
+                "user": user["_id"],
+                "book": book["_id"],
+                "copy": copy["_id"],
+                "borrow_date": borrowed,
+                "due_date": borrowed + timedelta(days=14),
+                "return_date": borrowed + timedelta(days=random.randint(1, 30)) if returned else None,
+                "returned": returned,
+                "fine": 0.0,
+                "fine_payment_status": "Not Applicable",
+                "remarks_on_return": SEED_MARKER,
+                "book_title": book["title"],
+                "barcode": copy["barcode"],
+                "username": user["username"],
+                "user_email": user["email"],
+            })
+            if len(record_batch) >= batch_size:
+                copies.insert_many(copy_batch, ordered=False)
+                records.insert_many(record_batch, ordered=False)
+                copy_batch, record_batch = [], []
+        if record_batch:
+            copies.insert_many(copy_batch, ordered=False)
+            records.insert_many(record_batch, ordered=False)
+        return [u["_id"] for u in users], [b["_id"] for b in books]
+
+    def _cleanup(self, user_ids, book_ids):
+        BorrowRecord._get_collection().delete_many({"remarks_on_return": SEED_MARKER})
+        BookCopy._get_collection().delete_many({"remarks": SEED_MARKER})
+        User._get_collection().delete_many({"_id": {"$in": user_ids}})
+        Book._get_collection().delete_many({"_id": {"$in": book_ids}})
@@ -0,0 +1,100 @@
+# borrow/management/commands/bench_checkout_contention.py
+import random
+import threading
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from books.models import Book, BookCopy
+from borrow.circulation import checkout_copy
+from borrow.models import BorrowRecord
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Check out the same copies from many threads at once and report checkouts/s. "
+        "Fails if any copy is lent twice or the Book counters drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--copies", type=int, default=200)
+        parser.add_argument(
+            "--mode", choices=("copy", "book"), default="copy",
+            help="copy: every thread scans every copy id; book: every thread asks for any copy by book_id",
+        )
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        book = Book(title=f"Checkout contention {run_id}", author="bench")
+        book.save()
+        BookCopy.bulk_create(book.id, [f"CONTEND-{run_id}-{i}" for i in range(options["copies"])])
+        copy_ids = [c["_id"] for c in BookCopy._get_collection().find({"book": book.id}, {"_id": 1})]
+        users = [
+            User(username=f"contend_{run_id}_{i}", email=f"contend_{run_id}_{i}@bench.local", password_hash="x")
+            for i in range(options["threads"])
+        ]
+        User.objects.insert(users)
+
+        wins, attempts, errors = [], [0], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(options["threads"])
+
+        def worker(user):
+            try:
+                barrier.wait()
+                if options["mode"] == "copy":
+                    order = copy_ids[:]
+                    random.shuffle(order)
+                    for copy_id in order:
+                        record, _, _ = checkout_copy(user, copy_id=copy_id)
+                        with lock:
+                            attempts[0] += 1
+                            if record:
+                                wins.append(record["copy"])
+                else:
+                    while True:
+                        record, _, _ = checkout_copy(user, book_id=book.id)
+                        with lock:
+                            attempts[0] += 1
+                            if not record:
+                                break
+                            wins.append(record["copy"])
+            except Exception as e:
+                errors.append(e)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            if errors:
+                raise CommandError(f"{len(errors)} worker(s) failed: {errors[0]}")
+
+            double_lends = list(BorrowRecord._get_collection().aggregate([
+                {"$match": {"copy": {"$in": copy_ids}, "returned": False}},
+                {"$group": {"_id": "$copy", "n": {"$sum": 1}}},
+                {"$match": {"n": {"$gt": 1}}},
+            ]))
+            book.reload()
+            self.stdout.write(
+                f"{len(wins)} checkouts / {attempts[0]} attempts in {elapsed:.2f}s "
+                f"({len(wins) / elapsed:.0f} checkouts/s, {attempts[0] / elapsed:.0f} attempts/s)"
+            )
+            self.stdout.write(f"double lends     {len(double_lends)}")
+            self.stdout.write(f"available_copies {book.available_copies} (expected 0)")
+
+            if double_lends or len(wins) != len(set(wins)):
+                raise CommandError("A copy was lent more than once")
+            if len(wins) != len(copy_ids) or book.available_copies != 0:
+                raise CommandError("Checkouts and Book counters do not match the copies lent")
+            self.stdout.write(self.style.SUCCESS("Zero double lends"))
+        finally:
+            BorrowRecord._get_collection().delete_many({"copy": {"$in": copy_ids}})
+            BookCopy._get_collection().delete_many({"book": book.id})
+            Book._get_collection().delete_one({"_id": book.id})
+            User._get_collection().delete_many({"username": {"$regex": f"^contend_{run_id}_"}})
@@ -0,0 +1,142 @@
+# borrow/management/commands/check_query_plans.py
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+from borrow.models import BorrowRecord
+
+PAGE = 11  # keyset pages fetch limit + 1
+SORT = [("borrow_date", -1), ("_id", -1)]
+FINE_SORT = [("fine", -1), ("_id", -1)]
+SEED_MARKER = "__query_plan_seed__"
+
+
+def _stages(plan):
+    """Every stage name in a (winning) plan tree."""
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def hot_queries(sample, now):
+    """
+    (name, kind, spec, max examined/returned ratio) for every query the views
+    run on BorrowRecord. kind is "find" (spec: filter, sort) or "count" (spec: filter).
+    """
+    user, book, copy = sample["user"], sample["book"], sample["copy"]
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return [
+        ("list_borrows", "find", ({}, SORT), 2),
+        ("list_borrows ?user_id", "find", ({"user": user}, SORT), 2),
+        ("list_borrows ?book_id", "find", ({"book": book}, SORT), 2),
+        ("list_borrows ?status=active", "find", ({"returned": False}, SORT), 2),
+        ("list_borrows ?status=returned", "find", ({"returned": True}, SORT), 2),
+        # Overdue rows are found by walking open loans newest first, so allow more slack
+        ("list_borrows ?status=overdue", "find", ({"returned": False, "due_date": {"$lt": now}}, SORT), 20),
+        ("search_borrows user+status", "find", ({"user": user, "returned": False}, SORT), 2),
+        ("search_borrows ?username", "find",
+         ({"$or": [{"username": sample.get("username")}, {"user_email": sample.get("username")}]}, SORT), 2),
+        ("search_borrows ?barcode", "find", ({"barcode": sample.get("barcode")}, SORT), 2),
+        ("get_user_borrow_history", "find", ({"user": user}, SORT), 2),
+        ("return_book", "find", ({"user": user, "copy": copy, "returned": False}, None), 2),
+        ("batch_return", "find", ({"copy": {"$in": [copy]}, "returned": False}, None), 2),
+        ("outstanding_fines", "find", ({"fine_payment_status": "Pending"}, FINE_SORT), 2),
+        ("outstanding_fines ?user_id", "find",
+         ({"user": user, "fine_payment_status": "Pending"}, FINE_SORT), 2),
+        ("materialize_fines", "count", {"returned": False, "due_date": {"$lte": now - timedelta(days=1)}}, 2),
+        ("dashboard active", "count", {"returned": False}, 2),
+        ("dashboard overdue", "count", {"returned": False, "due_date": {"$lt": now}}, 2),
+        ("dashboard borrows/day", "count", {"borrow_date": {"$gte": day, "$lt": day + timedelta(days=1)}}, 2),
+        ("dashboard returns/day", "count", {"return_date": {"$gte": day, "$lt": day + timedelta(days=1)}}, 2),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run explain() for the hot BorrowRecord queries of the borrow, dashboard and stats views "
+        "and fail if any of them uses a COLLSCAN or examines far more documents than it returns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0,
+                            help="insert this many synthetic records first (removed afterwards)")
+
+    def handle(self, *args, **options):
+        BorrowRecord.ensure_indexes()
+        collection = BorrowRecord._get_collection()
+        db = collection.database
+        now = datetime.utcnow()
+
+        if options["seed"]:
+            self._seed(collection, options["seed"], now)
+        try:
+            sample = collection.find_one({}, {"user": 1, "book": 1, "copy": 1, "username": 1, "barcode": 1})
+            if not sample:
+                raise CommandError("BorrowRecord is empty; use --seed N")
+
+            failures = []
+            self.stdout.write(f"{'query':<34} {'plan':<28} {'returned':>9} {'keys':>9} {'docs':>9}")
+            for name, kind, spec, max_ratio in hot_queries(sample, now):
+                if kind == "find":
+                    query, sort = spec
+                    command = {"find": collection.name, "filter": query, "limit": PAGE}
+                    if sort:
+                        command["sort"] = dict(sort)
+                    returned = None
+                else:
+                    query = spec
+                    command = {"count": collection.name, "query": query}
+                    returned = collection.count_documents(query)
+
+                explain = db.command("explain", command, verbosity="executionStats")
+                stats = explain["executionStats"]
+                stages = set(_stages(explain["queryPlanner"]["winningPlan"]))
+                if returned is None:
+                    returned = stats["nReturned"]
+                examined = stats["totalDocsExamined"]
+
+                plan = ",".join(sorted(s for s in stages if s))
+                self.stdout.write(
+                    f"{name:<34} {plan[:28]:<28} {returned:>9} {stats['totalKeysExamined']:>9} {examined:>9}"
+                )
+                if "COLLSCAN" in stages:
+                    failures.append(f"{name}: COLLSCAN")
+                elif examined > max(returned, 1) * max_ratio:
+                    failures.append(f"{name}: examined {examined} documents for {returned}")
+
+            if failures:
+                raise CommandError("Query plan regressions:\n  " + "\n  ".join(failures))
+            self.stdout.write(self.style.SUCCESS("All hot queries use an index"))
+        finally:
+            if options["seed"]:
+                collection.delete_many({"remarks_on_return": SEED_MARKER})
+
+    def _seed(self, collection, count, now):
+        users = [ObjectId() for _ in range(max(1, count // 20))]
+        books = [ObjectId() for _ in range(max(1, count // 10))]
+        batch = []
+        for i in range(count):
+            borrowed = now - timedelta(days=random.randint(0, 365), minutes=i % 1440)
+            returned = random.random() < 0.8
+            batch.append({
+                "user": random.choice(users),
+                "book": random.choice(books),
+                "copy": ObjectId(),
+                "borrow_date": borrowed,
+                "due_date": borrowed + timedelta(days=14),
+                "return_date": borrowed + timedelta(days=random.randint(1, 30)) if returned else None,
+                "returned": returned,
+                "fine": 0.0,
+                "fine_payment_status": "Not Applicable",
+                "remarks_on_return": SEED_MARKER,
+                "username": f"seed_user_{i % 997}",
+                "barcode": f"SEED-{i}",
+            })
+            if len(batch) >= 10000:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
@@ -0,0 +1,44 @@
+# borrow/management/commands/reconcile_active_loans.py
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from borrow.models import BorrowRecord
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Rebuild User.active_loans from the open BorrowRecords and report every counter that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="only report drift, change nothing")
+
+    def handle(self, *args, **options):
+        actual = {
+            row["_id"]: row["n"]
+            for row in BorrowRecord._get_collection().aggregate([
+                {"$match": {"returned": False}},
+                {"$group": {"_id": "$user", "n": {"$sum": 1}}},
+            ], allowDiskUse=True)
+        }
+
+        ops, drifted = [], 0
+        for user in User._get_collection().find({}, {"username": 1, "active_loans": 1}):
+            stored = user.get("active_loans")
+            expected = actual.get(user["_id"], 0)
+            if stored != expected:
+                drifted += 1
+                self.stdout.write(f"{user.get('username')}: {stored} -> {expected}")
+                # Only overwrite the value we read, so a concurrent borrow/return is not lost
+                ops.append(UpdateOne(
+                    {"_id": user["_id"], "active_loans": stored} if stored is not None
+                    else {"_id": user["_id"], "active_loans": {"$exists": False}},
+                    {"$set": {"active_loans": expected}},
+                ))
+
+        if ops and not options["dry_run"]:
+            result = User._get_collection().bulk_write(ops, ordered=False)
+            skipped = len(ops) - result.modified_count
+            if skipped:
+                self.stdout.write(self.style.WARNING(f"{skipped} user(s) changed meanwhile; run again"))
+
+        verb = "would fix" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{drifted} counter(s) drifted, {verb}"))
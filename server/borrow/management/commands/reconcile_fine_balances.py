@@ -0,0 +1,86 @@
+# borrow/management/commands/reconcile_fine_balances.py
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from borrow.models import BorrowRecord, FineLedgerEntry
+from users.models import User
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild User.fine_balance from the fine ledger and report every balance that drifted. "
+        "Unpaid fines of returned records with no ledger entry yet are charged to the ledger first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="only report drift, change nothing")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        FineLedgerEntry.ensure_indexes()
+        if not options["dry_run"]:
+            charged = self._backfill(options["batch_size"])
+            self.stdout.write(f"{charged} unpaid fine(s) added to the ledger")
+
+        actual = {
+            row["_id"]: round(row["balance"], 2)
+            for row in FineLedgerEntry._get_collection().aggregate([
+                {"$group": {"_id": "$user", "balance": {"$sum": "$amount"}}},
+            ], allowDiskUse=True)
+        }
+
+        ops, drifted = [], 0
+        for user in User._get_collection().find({}, {"username": 1, "fine_balance": 1}):
+            stored = user.get("fine_balance")
+            expected = actual.get(user["_id"], 0.0)
+            if stored is None or round(stored, 2) != expected:
+                drifted += 1
+                self.stdout.write(f"{user.get('username')}: {stored} -> {expected}")
+                # Only overwrite the value we read, so a concurrent return/payment is not lost
+                ops.append(UpdateOne(
+                    {"_id": user["_id"], "fine_balance": stored} if stored is not None
+                    else {"_id": user["_id"], "fine_balance": {"$exists": False}},
+                    {"$set": {"fine_balance": expected}},
+                ))
+
+        if ops and not options["dry_run"]:
+            result = User._get_collection().bulk_write(ops, ordered=False)
+            skipped = len(ops) - result.modified_count
+            if skipped:
+                self.stdout.write(self.style.WARNING(f"{skipped} user(s) changed meanwhile; run again"))
+
+        verb = "would fix" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{drifted} balance(s) drifted, {verb}"))
+
+    def _backfill(self, batch_size):
+        """Ledger entries for Pending fines recorded before the ledger existed."""
+        ledger = FineLedgerEntry._get_collection()
+        now, batch, charged = datetime.utcnow(), [], 0
+        cursor = BorrowRecord._get_collection().find(
+            {"fine_payment_status": "Pending", "returned": True, "fine": {"$gt": 0}},
+            {"user": 1, "fine": 1, "return_date": 1},
+        )
+        for record in cursor:
+            batch.append({
+                "user": record["user"], "borrow": record["_id"], "kind": "fine",
+                "amount": round(record["fine"], 2), "note": "Backfilled",
+                "recorded_by": None, "created_at": record.get("return_date") or now,
+            })
+            if len(batch) >= batch_size:
+                charged += self._insert(ledger, batch)
+                batch = []
+        if batch:
+            charged += self._insert(ledger, batch)
+        return charged
+
+    def _insert(self, ledger, batch):
+        # Loans already charged hit the unique (borrow, kind) index and are skipped
+        try:
+            return len(ledger.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            if any(err["code"] != DUPLICATE_KEY_ERROR for err in e.details.get("writeErrors", [])):
+                raise
+            return e.details.get("nInserted", 0)
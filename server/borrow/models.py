@@ -13,5 +13,67 @@ class BorrowRecord(Document):
     returned = BooleanField(default=False)  # ✅ Must exist!
     fine = FloatField(default=0.0)
     fine_payment_status = StringField(default="Not Applicable")
+    fine_accrued_at = DateTimeField(null=True)  # last nightly materialize_fines run that set `fine`
     book_condition_on_return = StringField(default="Good")
     remarks_on_return = StringField(default="")
+
+    # Snapshots taken at checkout so listings need no joins; kept in sync on
+    # rename by borrow.snapshots (backfill old records: manage.py backfill_borrow_snapshots)
+    book_title = StringField()
+    barcode = StringField()
+    username = StringField()
+    user_email = StringField()
+
+    # Every hot query in borrow/, users/ (dashboard) and books/ (stats) is
+    # covered by one of these; manage.py check_query_plans verifies it.
+    meta = {
+        "indexes": [
+            # Keyset pagination in list_borrows / get_user_borrow_history; dashboard date ranges
+            ("-borrow_date", "-id"),
+            ("user", "-borrow_date", "-id"),
+            # Per-user lists filtered by status (search_borrows, member summaries)
+            ("user", "returned", "-borrow_date", "-id"),
+            # list_borrows ?book_id= and ?status=
+            ("book", "-borrow_date", "-id"),
+            ("returned", "-borrow_date", "-id"),
+            # Active borrow of a copy (return_book, batch return)
+            ("copy", "returned"),
+            # search_borrows by username / barcode snapshot
+            ("username", "-borrow_date", "-id"),
+            ("user_email", "-borrow_date", "-id"),
+            ("barcode", "-borrow_date", "-id"),
+            # Overdue counts and filters
+            ("returned", "due_date"),
+            # Dashboard returns per day
+            "return_date",
+            # Outstanding fines (fine_payment_status="Pending"), largest first, overall and per user
+            ("fine_payment_status", "-fine", "-id"),
+            ("user", "fine_payment_status", "-fine", "-id"),
+        ]
+    }
+
+
+
+class FineLedgerEntry(Document):
+    """
+    Append-only record of fines charged and payments received.
+    User.fine_balance is the running sum of a user's entries (see borrow.ledger).
+    """
+    KINDS = ("fine", "payment")
+
+    user = ReferenceField(User, required=True)
+    borrow = ReferenceField(BorrowRecord, null=True)  # unset for payments not tied to one loan
+    kind = StringField(required=True, choices=KINDS)
+    amount = FloatField(required=True)  # positive for fines, negative for payments
+    note = StringField(default="")
+    recorded_by = ReferenceField(User, null=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "indexes": [
+            # A user's statement, newest first; reconciliation sums per user
+            ("user", "-created_at"),
+            # At most one fine per loan, so a retried return cannot charge twice
+            {"fields": ["borrow", "kind"], "unique": True, "partialFilterExpression": {"kind": "fine"}},
+        ]
+    }
@@ -0,0 +1,81 @@
+# borrow/read_model.py
+from bson import ObjectId
+from books.models import Book, BookCopy
+from users.models import User
+
+BORROW_PAGE_CAP = 100  # hard cap on rows per listing page
+
+
+def _lookup(document, local_field, snapshots, fields, alias):
+    # Only rows missing one of `snapshots` (records from before the snapshot
+    # fields) join; for the rest the guard fails before the _id probe runs
+    missing = {"$or": [{"$eq": [{"$ifNull": [f"${field}", None]}, None]} for field in snapshots]}
+    return {"$lookup": {
+        "from": document._get_collection_name(),
+        "let": {"id": f"${local_field}", "missing": missing},
+        "pipeline": [
+            {"$match": {"$expr": {"$and": ["$$missing", {"$eq": ["$_id", "$$id"]}]}}},
+            {"$project": {field: 1 for field in fields}},
+        ],
+        "as": alias,
+    }}
+
+
+def _joined(snapshot, alias, field):
+    """Snapshot value, or the joined document's value for records without one."""
+    return {"$ifNull": [f"${snapshot}", {"$arrayElemAt": [f"${alias}.{field}", 0]}]}
+
+
+# Applied after $limit, so the joins only touch the rows of the page
+BORROW_LOOKUP_STAGES = [
+    _lookup(Book, "book", ("book_title",), ("title",), "_book"),
+    _lookup(BookCopy, "copy", ("barcode",), ("barcode",), "_copy"),
+    _lookup(User, "user", ("username", "user_email"), ("username", "email"), "_user"),
+    {"$project": {
+        "borrow_date": 1,
+        "due_date": 1,
+        "return_date": 1,
+        "returned": 1,
+        "fine": 1,
+        "fine_payment_status": 1,
+        "book_condition_on_return": 1,
+        "remarks_on_return": 1,
+        "book_title": _joined("book_title", "_book", "title"),
+        "barcode": _joined("barcode", "_copy", "barcode"),
+        "username": _joined("username", "_user", "username"),
+        "user_email": _joined("user_email", "_user", "email"),
+    }},
+]
+
+
+def borrow_match(now, user_id=None, book_id=None, username=None, barcode=None, status=None):
+    """
+    Raw $match for the borrow listings; every combination is served by one of
+    the BorrowRecord indexes. Raises bson InvalidId for malformed ids.
+    """
+    match = {}
+    if user_id:
+        match["user"] = ObjectId(user_id)
+    if book_id:
+        match["book"] = ObjectId(book_id)
+    if username:
+        match["$or"] = [{"username": username}, {"user_email": username}]
+    if barcode:
+        match["barcode"] = barcode
+    if status == "active":
+        match["returned"] = False
+    elif status == "returned":
+        match["returned"] = True
+    elif status == "overdue":
+        match["returned"] = False
+        match["due_date"] = {"$lt": now}
+    return match
+
+
+def page_limit(value, default):
+    """?limit= clamped to 1..BORROW_PAGE_CAP."""
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, BORROW_PAGE_CAP))
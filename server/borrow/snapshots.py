@@ -0,0 +1,81 @@
+# borrow/snapshots.py
+from pymongo import UpdateOne
+from backend.utils.prefetch import prefetch_related
+from books.models import Book, BookCopy
+from borrow.models import BorrowRecord
+from users.models import User
+
+# Snapshot field on BorrowRecord -> (reference field, referenced Document, source field)
+SNAPSHOT_SOURCES = {
+    "book_title": ("book", Book, "title"),
+    "barcode": ("copy", BookCopy, "barcode"),
+    "username": ("user", User, "username"),
+    "user_email": ("user", User, "email"),
+}
+SNAPSHOT_FIELDS = tuple(SNAPSHOT_SOURCES)
+
+
+def fill_snapshots(rows, fields=SNAPSHOT_FIELDS):
+    """
+    Make sure raw BorrowRecord rows carry the snapshot fields. Records written
+    before snapshots existed (and not backfilled yet) are resolved with one
+    $in per reference; every other row is served as stored, with no join.
+    """
+    missing = [row for row in rows if any(row.get(f) is None for f in fields)]
+    if not missing:
+        return rows
+
+    relations = {}
+    for field in fields:
+        ref, document, source = SNAPSHOT_SOURCES[field]
+        relations.setdefault(ref, (document, set()))[1].add(source)
+    prefetch_related(missing, {ref: (document, tuple(sources)) for ref, (document, sources) in relations.items()})
+
+    for row in missing:
+        for field in fields:
+            ref, _, source = SNAPSHOT_SOURCES[field]
+            if row.get(field) is None:
+                row[field] = (row[ref] or {}).get(source)
+    return rows
+
+
+def backfill_batch(rows):
+    """Write snapshot values for raw rows resolved by fill_snapshots; one bulk_write."""
+    ops = [
+        UpdateOne({"_id": row["_id"]}, {"$set": {f: row.get(f) for f in SNAPSHOT_FIELDS}})
+        for row in rows
+    ]
+    if ops:
+        BorrowRecord._get_collection().bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def sync_snapshots(ref, ref_id, changes):
+    """
+    Propagate a renamed title / username / email / barcode to the snapshots of
+    every BorrowRecord pointing at ref_id (one update_many on an indexed field).
+    changes maps snapshot field -> new value.
+    """
+    if not changes:
+        return 0
+    result = BorrowRecord._get_collection().update_many(
+        {ref: ref_id, "$or": [{f: {"$ne": v}} for f, v in changes.items()]},
+        {"$set": changes},
+    )
+    return result.modified_count
+
+
+def queue_snapshot_sync(ref, ref_id, changes):
+    """
+    Called after a title, username, email or barcode changes. The update runs in
+    a worker; if the task cannot be queued it runs inline instead.
+    """
+    if not changes:
+        return
+    from borrow.task import sync_borrow_snapshots
+
+    try:
+        sync_borrow_snapshots.delay(ref, str(ref_id), changes)
+    except Exception as e:
+        print("Could not queue borrow snapshot sync:", str(e))
+        sync_snapshots(ref, ref_id, changes)
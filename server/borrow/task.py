@@ -0,0 +1,24 @@
+# borrow/task.py
+from bson import ObjectId
+from celery import shared_task
+from borrow.archive import archive_returned, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from borrow.fines import materialize_fines
+from borrow.snapshots import sync_snapshots
+
+
+@shared_task
+def sync_borrow_snapshots(ref, ref_id, changes):
+    """Refresh BorrowRecord snapshot fields after a book, copy or user was renamed."""
+    return sync_snapshots(ref, ObjectId(ref_id), changes)
+
+
+@shared_task(acks_late=True)
+def archive_borrow_records(days=None, batch_size=None):
+    """Celery beat: move old returned records into the monthly archive partitions."""
+    return archive_returned(days or ARCHIVE_AFTER_DAYS, batch_size or ARCHIVE_BATCH_SIZE)
+
+
+@shared_task(acks_late=True)
+def materialize_borrow_fines():
+    """Celery beat: write the accrued fine onto every overdue active loan."""
+    return materialize_fines()
@@ -1,3 +1,75 @@
-from django.test import TestCase
+from unittest import mock
+from bson import ObjectId
+from django.test import SimpleTestCase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from borrow import ledger
 
-# Create your tests here.
+
+def duplicate_keys(*indexes):
+    return BulkWriteError({
+        "writeErrors": [{"index": i, "code": ledger.DUPLICATE_KEY_ERROR, "errmsg": "E11000"} for i in indexes],
+        "nInserted": 0,
+    })
+
+
+# -------------------------
+# Fine ledger (borrow/ledger.py)
+# -------------------------
+class RecordFinesTests(SimpleTestCase):
+    def setUp(self):
+        self.entries = mock.MagicMock()
+        self.users = mock.MagicMock()
+        for model, collection in ((ledger.FineLedgerEntry, self.entries), (ledger.User, self.users)):
+            patcher = mock.patch.object(model, "_get_collection", return_value=collection)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user, self.borrow = ObjectId(), ObjectId()
+
+    def inserted(self):
+        return [entry for call in self.entries.insert_many.call_args_list for entry in call.args[0]]
+
+    def test_unpaid_fine_is_charged(self):
+        self.assertEqual(ledger.record_fine(self.user, self.borrow, 15), 1)
+        self.assertEqual([e["kind"] for e in self.inserted()], ["fine"])
+        self.users.bulk_write.assert_called_once_with(
+            [UpdateOne({"_id": self.user}, {"$inc": {"fine_balance": 15.0}})], ordered=False,
+        )
+
+    def test_fine_paid_at_return_leaves_the_balance_alone(self):
+        self.assertEqual(ledger.record_fine(self.user, self.borrow, 15, paid=True), 2)
+        self.assertEqual([(e["kind"], e["amount"]) for e in self.inserted()], [("fine", 15.0), ("payment", -15.0)])
+        self.users.bulk_write.assert_not_called()
+
+    def test_retried_paid_return_writes_nothing(self):
+        self.entries.insert_many.side_effect = duplicate_keys(0)
+        self.assertEqual(ledger.record_fine(self.user, self.borrow, 15, paid=True), 0)
+        # Only the fines were attempted: no second payment entry, no credit
+        self.assertEqual([e["kind"] for e in self.inserted()], ["fine"])
+        self.users.bulk_write.assert_not_called()
+
+    def test_retried_unpaid_return_is_not_charged_twice(self):
+        self.entries.insert_many.side_effect = duplicate_keys(0)
+        self.assertEqual(ledger.record_fine(self.user, self.borrow, 15), 0)
+        self.users.bulk_write.assert_not_called()
+
+    def test_payments_follow_only_the_fines_that_were_inserted(self):
+        other = ObjectId()
+        self.entries.insert_many.side_effect = duplicate_keys(0)
+        ledger.record_fines([(self.user, self.borrow, 10, True), (other, ObjectId(), 20, False)])
+
+        self.assertEqual([e["kind"] for e in self.inserted()], ["fine", "fine"])
+        self.users.bulk_write.assert_called_once_with(
+            [UpdateOne({"_id": other}, {"$inc": {"fine_balance": 20.0}})], ordered=False,
+        )
+
+    def test_other_write_errors_are_raised(self):
+        self.entries.insert_many.side_effect = BulkWriteError({"writeErrors": [{"index": 0, "code": 121}]})
+        with self.assertRaises(BulkWriteError):
+            ledger.record_fine(self.user, self.borrow, 15)
+        self.users.bulk_write.assert_not_called()
+
+    def test_balance_change_invalidates_the_cached_principal(self):
+        with mock.patch.object(ledger.principal_cache, "invalidate") as invalidate:
+            ledger.record_fine(self.user, self.borrow, 15)
+        invalidate.assert_called_once_with(self.user)
@@ -6,7 +6,9 @@ urlpatterns = [
     # 📗 Member Endpoints
     # --------------------------
     path('create/', views.borrow_book, name='borrow_book'),                      # POST → borrow a book
+    path('batch-checkout/', views.batch_checkout_view, name='batch_checkout'),     # POST → lend several copies to one user
     path('return/', views.return_book, name='return_book'),                      # PUT → return a book (barcode + user_email/username)
+    path('batch-return/', views.batch_return_view, name='batch_return'),          # POST → check in a list of barcodes (book drop)
 
     # --------------------------
     # 📘 Librarian Endpoints
@@ -20,7 +22,11 @@ urlpatterns = [
     # path('admin/all/', views.admin_list_all_borrows, name='admin_list_all_borrows'),
     path("member-summary/", views.member_borrow_summary),
     path("member-summary/<str:user_identifier>/", views.librarian_view_member_summary),
-    path("calculate-fine/", views.get_fine,name="get_fine"),  # POST → calculate fine for a borrow record
+    path("calculate-fine/", views.get_fine,name="get_fine"),  # POST → stored fine of a borrow record
+    path("fines/outstanding/", views.outstanding_fines, name="outstanding_fines"),  # GET → unpaid fines, largest first
+    path("fines/payments/", views.record_fine_payment, name="record_fine_payment"),  # POST → record a fine payment
+    path("fines/balance/<str:user_identifier>/", views.fine_balance, name="fine_balance"),  # GET → member's outstanding balance
+    path("admin/export/", views.export_borrow_records, name="export_borrow_records"),  # GET → stream records as CSV/NDJSON
     path("search/", views.search_borrows, name="search_borrows"),  # GET → search borrow records by user or book
      path('borrow-history/', views.get_user_borrow_history, name='get_user_borrow_history'),
      path('borrow-history/', views.get_user_borrow_history, name='get_user_borrow_history'),
@@ -1,39 +1,45 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 from backend.utils.permissions import require_role
-from backend.utils.pagination import paginate
-from backend.utils.json_utils import to_dict, to_dict_list
+from backend.utils.pagination import paginate, keyset_paginate, keyset_aggregate, count_queryset, COUNT_MODES
+from backend.utils.export import export_response, export_options
+from backend.utils.json_utils import to_dict, to_dict_list, lean
+from borrow.snapshots import fill_snapshots
+from borrow.archive import user_history
+from borrow.ledger import current_balance, record_fine, record_payment, statement
+from borrow.read_model import BORROW_LOOKUP_STAGES, borrow_match, page_limit
 from backend.utils.auth_utils import decode_token
 from books.models import Book
 from borrow.models import BorrowRecord
 from users.models import User
 import json
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # -------------------------
 # CREATE BORROW RECORD (MEMBER)
 # -------------------------
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
+from mongoengine.errors import ValidationError
+from borrow.circulation import (
+    batch_checkout, batch_return, calculate_fine, checkout_copy, reserve_loans, release_loans,
+)
+from bson import ObjectId
+from bson.errors import InvalidId
 from backend.utils.permissions import require_role
 from books.models import Book, BookCopy
 from borrow.models import BorrowRecord
 from users.models import User
-from datetime import datetime, timedelta
+from datetime import datetime
 import json, os
 
-
-# -------------------------
-# Helper: Calculate Fine
-# -------------------------
-@csrf_exempt
-def calculate_fine(due_date, return_date=None):
-    if not return_date:
-        return_date = datetime.utcnow()
-    fine_per_day = float(os.getenv("FINE_PER_DAY", 5))
-    days_overdue = max(0, (return_date - due_date).days)
-    return days_overdue * fine_per_day
+BORROW_SORT = "-borrow_date,-id"
+BORROW_LIST_FIELDS = (
+    "id", "user", "book", "copy", "borrow_date", "due_date", "return_date", "returned",
+    "fine", "fine_payment_status", "book_condition_on_return", "remarks_on_return",
+    "book_title", "barcode", "username", "user_email",
+)
 
 @csrf_exempt
 def get_fine(request):
@@ -51,12 +57,13 @@ def get_fine(request):
         if not borrow_record:
             return JsonResponse({"error": "Borrow record not found."}, status=404)
 
-        # Calculate fine using server-side due_date
-        fine = calculate_fine(borrow_record.due_date)
-
+        # Fine as stored on the record: final once returned, otherwise the
+        # amount accrued at the last nightly materialize_fines run
         return JsonResponse({
             "borrow_id": borrow_id,
-            "fine": fine
+            "fine": borrow_record.fine or 0.0,
+            "fine_payment_status": borrow_record.fine_payment_status,
+            "accrued_at": borrow_record.fine_accrued_at.isoformat() if borrow_record.fine_accrued_at else None
         }, status=200)
 
     except Exception as e:
@@ -135,7 +142,9 @@ def borrow_book(request):
     API for librarians to lend a book copy to a specific user.
     Expects POST request with:
         - user_id
-        - copy_id
+        - copy_id, or book_id to lend any available copy of that book
+    The copy is claimed with one conditional find_one_and_update, so the same
+    copy can never be lent twice by concurrent requests.
     """
     if request.method != "POST":
         return JsonResponse({"error": "Invalid method"}, status=405)
@@ -144,61 +153,156 @@ def borrow_book(request):
         data = json.loads(request.body)
         user_id = data.get("user_id")
         copy_id = data.get("copy_id")
+        book_id = data.get("book_id")
 
-        if not user_id or not copy_id:
-            return JsonResponse({"error": "user_id and copy_id are required."}, status=400)
+        if not user_id or not (copy_id or book_id):
+            return JsonResponse({"error": "user_id and copy_id (or book_id) are required."}, status=400)
 
-        # Fetch user and copy
-        user = User.objects.get(id=user_id)
-        copy = BookCopy.objects.get(id=copy_id)
+        # Fetch user
+        user = User.objects.only("id", "username", "email").get(id=user_id)
 
-        if not copy.is_available:
-            return JsonResponse({"error": "Selected copy is not available."}, status=400)
+        copy_oid = ObjectId(copy_id) if copy_id else None
+        book_oid = ObjectId(book_id) if not copy_id else None
 
-        # Borrow limits for members (optional, can skip for librarian override)
+        # Borrow limit: one conditional $inc on User.active_loans (active_loans < limit)
         MAX_BORROW_LIMIT = int(os.getenv("MAX_BORROW_LIMIT", 3))
-        active_borrows = BorrowRecord.objects.filter(user=user, returned=False).count()
-        if active_borrows >= MAX_BORROW_LIMIT:
+        if not reserve_loans(user.id, 1, MAX_BORROW_LIMIT):
             return JsonResponse({"error": "User has reached borrow limit."}, status=400)
 
-        # Borrow duration
-        BORROW_DAYS = int(os.getenv("BORROW_DAYS", 14))
-
-        # Create borrow record
-        borrow_record = BorrowRecord.objects.create(
-            user=user,
-            book=copy.book,
-            copy=copy,
-            borrow_date=datetime.utcnow(),
-            due_date=datetime.utcnow() + timedelta(days=BORROW_DAYS),
-            returned=False,
-            fine=0.0,
-            fine_payment_status="Not Applicable"
-        )
-
-        # Update copy
-        copy.is_available = False
-        copy.last_borrowed_at = datetime.utcnow()
-        copy.save()
-
-        # Update book availability (assuming Book model has decrement_available())
-        copy.book.decrement_available()
+        try:
+            record, copy, due_date = checkout_copy(user, copy_id=copy_oid, book_id=book_oid)
+        except Exception:
+            release_loans({user.id: 1})
+            raise
+        if record is None:
+            release_loans({user.id: 1})
+
+        if copy_id:
+            if record is None:
+                if not BookCopy.objects(id=copy_oid).count():
+                    return JsonResponse({"error": "Book copy not found."}, status=404)
+                return JsonResponse({"error": "Selected copy is not available."}, status=400)
+        else:
+            if record is None:
+                updated = Book.objects(id=book_oid).update_one(add_to_set__waitlist=str(user.id))
+                if not updated:
+                    return JsonResponse({"error": "Book not found."}, status=404)
+                return JsonResponse({"message": "No copies available. Added to waitlist."}, status=200)
 
         return JsonResponse({
             "message": f"Book copy lent to {user.username} successfully.",
-            "borrow_id": str(borrow_record.id),
-            "book_title": copy.book.title,
-            "barcode": copy.barcode,
-            "due_date": borrow_record.due_date
+            "borrow_id": str(record["_id"]),
+            "book_title": record["book_title"],
+            "barcode": copy["barcode"],
+            "due_date": due_date
         }, status=201)
 
     except User.DoesNotExist:
         return JsonResponse({"error": "User not found."}, status=404)
-    except BookCopy.DoesNotExist:
-        return JsonResponse({"error": "Book copy not found."}, status=404)
+    except InvalidId:
+        return JsonResponse({"error": "Invalid copy_id or book_id."}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+# -------------------------
+# Batch Checkout (Librarian)
+# -------------------------
+@csrf_exempt
+@require_role("librarian")
+def batch_checkout_view(request):
+    """
+    Lend a stack of copies to one user in one request.
+    Expects POST with:
+        - user_id
+        - items: list of copy ids and/or barcodes
+    Returns one result per item; copies that cannot be lent do not stop the rest.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    user_id = data.get("user_id")
+    items = data.get("items") or []
+    if not user_id or not isinstance(items, list) or not items:
+        return JsonResponse({"error": "user_id and a non-empty items list are required."}, status=400)
+    if not all(isinstance(item, str) and item for item in items):
+        return JsonResponse({"error": "items must be copy ids or barcodes."}, status=400)
+
+    try:
+        user = User.objects.only("id", "username", "email", "active_loans").get(id=user_id)
+    except (User.DoesNotExist, ValidationError):
+        return JsonResponse({"error": "User not found."}, status=404)
+
+    try:
+        results, due_date = batch_checkout(user, items)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    borrowed = sum(1 for r in results if r["status"] == "borrowed")
+    return JsonResponse({
+        "message": f"{borrowed} of {len(items)} copies lent to {user.username}.",
+        "user_id": str(user.id),
+        "due_date": due_date,
+        "borrowed": borrowed,
+        "failed": len(items) - borrowed,
+        "results": results,
+    }, status=201 if borrowed else 400)
+
+# -------------------------
+# Batch Return / Drop-box Check-in (Librarian)
+# -------------------------
+@csrf_exempt
+@require_role('admin','librarian')
+def batch_return_view(request):
+    """
+    Check in many copies in one request.
+    Expects POST with:
+        - items: list of barcodes, or of {"barcode", "condition", "remarks", "fine_paid"}
+        - condition (optional): default condition for items that give none
+    Returns one result per barcode.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    items = data.get("items") or []
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"error": "A non-empty items list is required."}, status=400)
+    items = [{"barcode": item} if isinstance(item, str) else item for item in items]
+    if not all(isinstance(item, dict) and isinstance(item.get("barcode"), str) and item["barcode"] for item in items):
+        return JsonResponse({"error": "Every item needs a barcode."}, status=400)
+    # Checked up front: batch_return closes the records before it writes anything else
+    for item in items:
+        for field, kind, expected in (("condition", str, "a string"), ("remarks", str, "a string"),
+                                      ("fine_paid", bool, "true or false")):
+            if item.get(field) is not None and not isinstance(item[field], kind):
+                return JsonResponse({"error": f"{field} must be {expected} ({item['barcode']})."}, status=400)
+    condition = data.get("condition") or "Good"
+    if not isinstance(condition, str):
+        return JsonResponse({"error": "condition must be a string."}, status=400)
+
+    try:
+        results = batch_return(items, condition)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+    returned = sum(1 for r in results if r["status"] == "returned")
+    return JsonResponse({
+        "message": f"{returned} of {len(items)} copies returned.",
+        "returned": returned,
+        "failed": len(items) - returned,
+        "total_fine": sum(r.get("fine", 0.0) for r in results),
+        "results": results,
+    }, status=200)
+
 # -------------------------
 # Return Book (Member or Librarian)
 # -------------------------
@@ -278,23 +382,27 @@ def return_book(request):
         else:
             borrow_record.fine_payment_status = "Not Applicable"
 
+        # Close the record atomically first so a concurrent return cannot release the loan twice
+        if not BorrowRecord.objects(id=borrow_record.id, returned=False).update_one(set__returned=True):
+            return JsonResponse({"error": "Borrow record already returned."}, status=409)
         borrow_record.save()
+        user_ref = borrow_record._data.get("user")
+        user_id = getattr(user_ref, "id", user_ref)
+        release_loans({user_id: 1})
+        record_fine(user_id, borrow_record.id, fine, paid=fine_paid,
+                    recorded_by=getattr(getattr(request, "user", None), "id", None))
 
-        # ✅ 4️⃣ Update copy & book availability (always, for both cases)
+        # ✅ 4️⃣ Update copy availability (BookCopy.save() increments available_copies)
         if copy:
             copy.is_available = True
             copy.condition = condition
             copy.is_damaged = (condition.lower() == "damaged")
             copy.save()
 
-        if book:
-            book.increment_copies()
-
         # 5️⃣ Notify next waitlist user (optional)
         if book and book.waitlist:
-            next_user_id = book.waitlist.pop(0)
-            book.save()
-            # TODO: send async email notification to next_user_id
+            # TODO: send async email notification to book.waitlist[0]
+            Book.objects(id=book.id).update_one(pop__waitlist=-1)
 
         return JsonResponse({
             "message": "Book returned successfully.",
@@ -309,85 +417,101 @@ def return_book(request):
 @csrf_exempt
 
 def list_borrows(request):
+    """
+    List/filter borrow records, newest first.
+    Keyset pagination on (borrow_date, id): follow next_cursor / prev_cursor
+    via ?cursor=; ?page= still works but skips rows. ?limit= is capped at 100.
+    ?count=exact|estimated|none controls the total (default none).
+
+    The page and its book / copy / user details come from one aggregation
+    (see borrow.read_model): indexed $match, $sort and $limit, then $lookups
+    only for page rows that predate the snapshot fields.
+    """
     page = int(request.GET.get("page", 1))
-    limit = int(request.GET.get("limit", 10))
-    user_id = request.GET.get("user_id")
-    book_id = request.GET.get("book_id")
-    status = request.GET.get("status")  # active, returned, overdue
-
-    filters = Q()
-    if user_id:
-        filters &= Q(user=user_id)
-    if book_id:
-        filters &= Q(book=book_id)
-    if status == "active":
-        filters &= Q(returned=False)
-    elif status == "returned":
-        filters &= Q(returned=True)
-    elif status == "overdue":
-        filters &= Q(returned=False, due_date__lt=datetime.utcnow())
-
-    queryset = BorrowRecord.objects(filters).order_by("-borrow_date")
-
-    total = queryset.count()
-    start = (page - 1) * limit
-    end = start + limit
+    limit = page_limit(request.GET.get("limit"), 10)
+    count_mode = request.GET.get("count", "none")
+
+    try:
+        match = borrow_match(
+            datetime.utcnow(),
+            user_id=request.GET.get("user_id"),
+            book_id=request.GET.get("book_id"),
+            status=request.GET.get("status"),  # active, returned, overdue
+        )
+        if count_mode not in COUNT_MODES:
+            raise ValueError(f"count must be one of {', '.join(COUNT_MODES)}")
+        paginated = keyset_aggregate(
+            BorrowRecord._get_collection(), match, BORROW_SORT, limit,
+            cursor=request.GET.get("cursor"),
+            stages=BORROW_LOOKUP_STAGES,
+            page=page,
+        )
+    except (ValueError, InvalidId) as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
     records = []
-    for b in queryset[start:end]:
+    for b in paginated["items"]:
         records.append({
-            "borrow_id": str(b.id),
-            "book": b.book.title,
-            "barcode": b.copy.barcode,
-            "user": b.user.username,
-            "borrow_date": b.borrow_date,
-            "due_date": b.due_date,
-            "returned": b.returned,
-            "fine": b.fine,
-            "condition": b.book_condition_on_return,
-            "remarks": b.remarks_on_return
+            "borrow_id": str(b["_id"]),
+            "book": b.get("book_title"),
+            "barcode": b.get("barcode"),
+            "user": b.get("username"),
+            "borrow_date": b.get("borrow_date"),
+            "due_date": b.get("due_date"),
+            "returned": b.get("returned"),
+            "fine": b.get("fine"),
+            "condition": b.get("book_condition_on_return"),
+            "remarks": b.get("remarks_on_return")
         })
 
     return JsonResponse({
-        "total": total,
+        "total": count_queryset(BorrowRecord.objects(__raw__=match), count_mode),
         "page": page,
         "limit": limit,
+        "next_cursor": paginated["next_cursor"],
+        "prev_cursor": paginated["prev_cursor"],
         "records": records
     })
+def build_member_summary(user):
+    """Active and returned borrows of a user, read from the records' snapshot fields."""
+    records = list(lean(BorrowRecord.objects(user=user.id).order_by("-borrow_date"), *BORROW_LIST_FIELDS))
+    fill_snapshots(records, ("book_title", "barcode"))
+
+    active_borrows = []
+    returned_books = []
+
+    for record in records:
+        if not record.get("returned"):
+            active_borrows.append({
+                "book_title": record["book_title"],
+                "barcode": record["barcode"],
+                "borrow_date": record.get("borrow_date"),
+                "due_date": record.get("due_date"),
+                "fine": record.get("fine") or 0.0
+            })
+        else:
+            returned_books.append({
+                "book_title": record["book_title"],
+                "barcode": record["barcode"],
+                "borrow_date": record.get("borrow_date"),
+                "return_date": record.get("return_date"),
+                "fine": record.get("fine"),
+                "fine_payment_status": record.get("fine_payment_status")
+            })
+
+    return {
+        "user": user.username,
+        "fine_balance": current_balance(user.id),
+        "active_borrows": active_borrows,
+        "returned_books": returned_books
+    }
+
 @csrf_exempt
 @require_role("member")
 def member_borrow_summary(request):
     try:
         user = request.user  # ✅ from JWT middleware
-        records = BorrowRecord.objects(user=user).order_by("-borrow_date")
-
-        active_borrows = []
-        returned_books = []
-
-        for record in records:
-            if not record.returned:
-                active_borrows.append({
-                    "book_title": record.book.title,
-                    "barcode": record.copy.barcode,
-                    "borrow_date": record.borrow_date,
-                    "due_date": record.due_date,
-                    "fine": calculate_fine(record.due_date)
-                })
-            else:
-                returned_books.append({
-                    "book_title": record.book.title,
-                    "barcode": record.copy.barcode,
-                    "borrow_date": record.borrow_date,
-                    "return_date": record.return_date,
-                    "fine": record.fine,
-                    "fine_payment_status": record.fine_payment_status
-                })
-
-        return JsonResponse({
-            "user": user.username,
-            "active_borrows": active_borrows,
-            "returned_books": returned_books
-        }, status=200)
+        return JsonResponse(build_member_summary(user), status=200)
 
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -407,34 +531,7 @@ def librarian_view_member_summary(request, user_identifier):
         if not user:
             return JsonResponse({"error": "User not found"}, status=404)
 
-        records = BorrowRecord.objects(user=user).order_by("-borrow_date")
-        active_borrows = []
-        returned_books = []
-
-        for record in records:
-            if not record.returned:
-                active_borrows.append({
-                    "book_title": record.book.title,
-                    "barcode": record.copy.barcode,
-                    "borrow_date": record.borrow_date,
-                    "due_date": record.due_date,
-                    "fine": calculate_fine(record.due_date)
-                })
-            else:
-                returned_books.append({
-                    "book_title": record.book.title,
-                    "barcode": record.copy.barcode,
-                    "borrow_date": record.borrow_date,
-                    "return_date": record.return_date,
-                    "fine": record.fine,
-                    "fine_payment_status": record.fine_payment_status
-                })
-
-        return JsonResponse({
-            "user": user.username,
-            "active_borrows": active_borrows,
-            "returned_books": returned_books
-        }, status=200)
+        return JsonResponse(build_member_summary(user), status=200)
 
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -461,39 +558,6 @@ def search_borrows(request):
         barcode = request.GET.get("barcode")
         status = request.GET.get("status")
 
-        # Start with all records
-        filters = {}
-
-        # ------------------------------
-        # 🔍 Search by username or email
-        # ------------------------------
-        if username:
-            user = User.objects(username=username).first() or User.objects(email=username).first()
-            if not user:
-                return JsonResponse({"count": 0, "results": []}, status=200)
-            filters["user"] = user.id  # MongoEngine uses id for references
-
-        # ------------------------------
-        # 🔍 Search by book barcode
-        # ------------------------------
-        if barcode:
-            copy = BookCopy.objects(barcode=barcode).first()
-            if not copy:
-                return JsonResponse({"count": 0, "results": []}, status=200)
-            filters["copy"] = copy.id  # Use id
-
-        # ------------------------------
-        # 📘 Filter by status (optional)
-        # ------------------------------
-        now = datetime.utcnow()
-        if status == "active":
-            filters["returned"] = False
-        elif status == "returned":
-            filters["returned"] = True
-        elif status == "overdue":
-            filters["returned"] = False
-            filters["due_date__lt"] = now
-
         # ------------------------------
         # If nothing provided, return empty list
         # ------------------------------
@@ -501,31 +565,43 @@ def search_borrows(request):
             return JsonResponse({"count": 0, "results": []}, status=200)
 
         # ------------------------------
-        # 📦 Fetch Records safely
+        # 📦 One aggregation: match on the username / email / barcode
+        # snapshots, keyset page of at most 100 rows, projected $lookups
         # ------------------------------
-        borrow_records = BorrowRecord.objects(**filters).order_by("-borrow_date")
+        match = borrow_match(datetime.utcnow(), username=username, barcode=barcode, status=status)
+        try:
+            paginated = keyset_aggregate(
+                BorrowRecord._get_collection(), match, BORROW_SORT,
+                page_limit(request.GET.get("limit"), 50),
+                cursor=request.GET.get("cursor"),
+                stages=BORROW_LOOKUP_STAGES,
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
         results = []
-        for record in borrow_records:
+        for record in paginated["items"]:
             results.append({
-                "borrow_id": str(record.id),
-                "user": record.user.username,
-                "email": record.user.email,
-                "book": record.book.title,
-                "barcode": record.copy.barcode,
-                "borrow_date": record.borrow_date.isoformat(),
-                "due_date": record.due_date.isoformat(),
-                "returned": record.returned,
-                "return_date": record.return_date.isoformat() if record.return_date else None,
-                "fine": record.fine,
-                "fine_payment_status": record.fine_payment_status,
-                "remarks": record.remarks_on_return or "",
-                "condition_on_return": record.book_condition_on_return or ""
+                "borrow_id": str(record["_id"]),
+                "user": record.get("username"),
+                "email": record.get("user_email"),
+                "book": record.get("book_title"),
+                "barcode": record.get("barcode"),
+                "borrow_date": record["borrow_date"].isoformat(),
+                "due_date": record["due_date"].isoformat(),
+                "returned": record.get("returned"),
+                "return_date": record["return_date"].isoformat() if record.get("return_date") else None,
+                "fine": record.get("fine"),
+                "fine_payment_status": record.get("fine_payment_status"),
+                "remarks": record.get("remarks_on_return") or "",
+                "condition_on_return": record.get("book_condition_on_return") or ""
             })
 
         return JsonResponse({
             "count": len(results),
-            "results": results
+            "results": results,
+            "next_cursor": paginated["next_cursor"],
+            "prev_cursor": paginated["prev_cursor"],
         }, status=200)
 
     except Exception as e:
@@ -541,14 +617,16 @@ def get_user_borrow_history(request):
         - Members can fetch only their own records
         - Admins and librarians can fetch any user's records
     Returns:
-        - records: list of all borrow records (both active and returned)
+        - records: list of all borrow records (both active and returned, archived ones included)
     Query params:
         - user_id (optional for admin/librarian, not needed for member)
-        - page (optional, default=1)
-        - limit (optional, default=10)
+        - cursor (optional, next_cursor / prev_cursor of a previous page)
+        - page (optional, default=1; skips rows, prefer cursor)
+        - limit (optional, default=100)
+        - count (optional, exact|estimated|none, default=none)
     """
     current_user = getattr(request, "user", None)
-    if not current_user:
+    if current_user is None:
         return JsonResponse({"error": "Unauthorized"}, status=401)
 
     # Get user_id from query params
@@ -578,34 +656,216 @@ def get_user_borrow_history(request):
     limit = int(request.GET.get("limit", 100))  # Higher limit for profile page
 
     # ---------------------------
-    # Fetch all borrow records
+    # Fetch borrow records: hot collection first, archive partitions
+    # only once the pages reach archived months
     # ---------------------------
-    all_records_qs = BorrowRecord.objects(user=user).order_by("-borrow_date")
-    
-    total = all_records_qs.count()
-    start = (page - 1) * limit
-    end = start + limit
-    
+    # The total counts every archive partition, so it is only added on ?count=
+    count_mode = request.GET.get("count", "none")
+    try:
+        if count_mode not in COUNT_MODES:
+            raise ValueError(f"count must be one of {', '.join(COUNT_MODES)}")
+        paginated = user_history(
+            user.id, BORROW_LIST_FIELDS, limit,
+            cursor=request.GET.get("cursor"),
+            page=page,
+            count=count_mode != "none",
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    rows = fill_snapshots(paginated["items"], ("book_title", "barcode"))
+
     records = []
-    for b in all_records_qs[start:end]:
+    for b in rows:
         record_data = {
-            "_id": str(b.id),
-            "book_title": b.book.title if b.book else "Unknown",
-            "barcode": b.copy.barcode if b.copy else "Unknown",
-            "borrow_date": b.borrow_date.isoformat() if b.borrow_date else None,
-            "due_date": b.due_date.isoformat() if b.due_date else None,
-            "return_date": b.return_date.isoformat() if b.return_date else None,
-            "status": "returned" if b.returned else "borrowed",
-            "returned": b.returned,
-            "fine": b.fine if b.fine else 0.0,
-            "condition_on_return": b.book_condition_on_return,
-            "remarks": b.remarks_on_return
+            "_id": str(b["_id"]),
+            "book_title": b["book_title"] or "Unknown",
+            "barcode": b["barcode"] or "Unknown",
+            "borrow_date": b["borrow_date"].isoformat() if b.get("borrow_date") else None,
+            "due_date": b["due_date"].isoformat() if b.get("due_date") else None,
+            "return_date": b["return_date"].isoformat() if b.get("return_date") else None,
+            "status": "returned" if b.get("returned") else "borrowed",
+            "returned": b.get("returned"),
+            "fine": b.get("fine") or 0.0,
+            "condition_on_return": b.get("book_condition_on_return"),
+            "remarks": b.get("remarks_on_return")
         }
         records.append(record_data)
 
     return JsonResponse({
         "records": records,
-        "total": total,
+        "total": paginated.get("total"),
         "page": page,
-        "limit": limit
-    }, status=200)
\ No newline at end of file
+        "limit": limit,
+        "next_cursor": paginated["next_cursor"],
+        "prev_cursor": paginated["prev_cursor"],
+    }, status=200)
+
+
+# -------------------------
+# OUTSTANDING FINES (LIBRARIAN / ADMIN)
+# -------------------------
+FINE_SORT = "-fine,-id"
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@require_role("admin", "librarian")
+def outstanding_fines(request):
+    """
+    Records with an unpaid fine (fine_payment_status "Pending"), largest first.
+    Active loans carry the fine accrued at the last nightly materialize_fines run.
+    Optional ?user_id=; keyset pagination via ?cursor= and ?limit= (max 100).
+    """
+    query = {"fine_payment_status": "Pending"}
+    try:
+        if request.GET.get("user_id"):
+            query["user"] = ObjectId(request.GET["user_id"])
+        paginated = keyset_paginate(
+            lean(BorrowRecord.objects(__raw__=query), *BORROW_LIST_FIELDS), FINE_SORT,
+            page_limit(request.GET.get("limit"), 50),
+            cursor=request.GET.get("cursor"),
+            count_mode=request.GET.get("count", "none"),
+        )
+    except (ValueError, InvalidId) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    rows = fill_snapshots(paginated["items"])
+    return JsonResponse({
+        "records": [{
+            "borrow_id": str(r["_id"]),
+            "user": r["username"],
+            "email": r["user_email"],
+            "book": r["book_title"],
+            "barcode": r["barcode"],
+            "due_date": r["due_date"].isoformat() if r.get("due_date") else None,
+            "returned": r.get("returned"),
+            "fine": r.get("fine") or 0.0,
+        } for r in rows],
+        "total": paginated.get("total"),
+        "next_cursor": paginated["next_cursor"],
+        "prev_cursor": paginated["prev_cursor"],
+    }, status=200)
+
+
+# -------------------------
+# FINE BALANCE & PAYMENTS (LIBRARIAN / ADMIN)
+# -------------------------
+def find_member(identifier):
+    """User by id, email or username, projected to what the fine desk needs."""
+    query = [{"email": identifier}, {"username": identifier}]
+    if ObjectId.is_valid(identifier):
+        query.append({"_id": ObjectId(identifier)})
+    return User._get_collection().find_one(
+        {"$or": query}, {"username": 1, "email": 1, "fine_balance": 1}
+    )
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@require_role("admin", "librarian")
+def fine_balance(request, user_identifier):
+    """
+    Outstanding balance of a member: one indexed fetch of the maintained
+    User.fine_balance. ?statement=N adds the latest N ledger entries.
+    """
+    user = find_member(user_identifier)
+    if not user:
+        return JsonResponse({"error": "User not found"}, status=404)
+
+    response = {
+        "user_id": str(user["_id"]),
+        "user": user.get("username"),
+        "fine_balance": user.get("fine_balance") or 0.0,
+    }
+    if request.GET.get("statement"):
+        response["statement"] = [{
+            "id": str(e["_id"]),
+            "kind": e["kind"],
+            "amount": e["amount"],
+            "borrow_id": str(e["borrow"]) if e.get("borrow") else None,
+            "note": e.get("note") or "",
+            "created_at": e["created_at"].isoformat(),
+        } for e in statement(user["_id"], page_limit(request.GET["statement"], 20))]
+    return JsonResponse(response, status=200)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@require_role("admin", "librarian")
+def record_fine_payment(request):
+    """
+    Record a fine payment.
+    Body: {"user": <id, email or username>, "amount": <number>, "borrow_id": optional, "note": optional}
+    With borrow_id the amount defaults to that loan's fine. Pending fines the
+    payment covers are marked Paid, oldest first.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    user = find_member(str(data.get("user") or ""))
+    if not user:
+        return JsonResponse({"error": "User not found"}, status=404)
+
+    borrow_id = None
+    amount = data.get("amount")
+    try:
+        if data.get("borrow_id"):
+            borrow_id = ObjectId(data["borrow_id"])
+            record = BorrowRecord._get_collection().find_one(
+                {"_id": borrow_id, "user": user["_id"], "returned": True, "fine_payment_status": "Pending"},
+                {"fine": 1},
+            )
+            if not record:
+                return JsonResponse({"error": "No unpaid fine found for this borrow_id."}, status=404)
+            if amount is None:
+                amount = record.get("fine") or 0.0
+        amount = float(amount)
+    except (InvalidId, TypeError, ValueError):
+        return JsonResponse({"error": "A valid amount (and borrow_id, if given) is required"}, status=400)
+    if amount <= 0:
+        return JsonResponse({"error": "amount must be positive"}, status=400)
+
+    result = record_payment(user["_id"], amount, borrow_id, data.get("note") or "", request.user.id)
+    if result is None:
+        return JsonResponse({
+            "error": "Payment exceeds the outstanding balance.",
+            "fine_balance": user.get("fine_balance") or 0.0,
+        }, status=409)
+
+    entry, balance, settled = result
+    return JsonResponse({
+        "message": "Payment recorded.",
+        "payment_id": str(entry.id),
+        "amount": amount,
+        "fine_balance": balance,
+        "settled_borrow_ids": [str(b) for b in settled],
+    }, status=201)
+
+
+# -------------------------
+# EXPORT BORROW RECORDS (ADMIN)
+# -------------------------
+BORROW_EXPORT_FIELDS = ("user", "book", "copy", "borrow_date", "due_date", "return_date", "returned",
+                        "fine", "fine_payment_status", "book_condition_on_return", "remarks_on_return")
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@require_role("admin", "librarian")
+def export_borrow_records(request):
+    """
+    Stream borrow records as CSV or NDJSON (?format=csv|ndjson, ?gzip=1).
+    Optional ?returned=true|false filter.
+    """
+    fmt, gzip = export_options(request)
+    query = {}
+    if request.GET.get("returned"):
+        query["returned"] = request.GET["returned"].lower() == "true"
+    try:
+        return export_response(BorrowRecord._get_collection(), BORROW_EXPORT_FIELDS, "borrow_records",
+                               query, fmt, gzip)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
\ No newline at end of file
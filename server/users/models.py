@@ -1,6 +1,7 @@
 # library/models.py
-from mongoengine import Document, StringField, EmailField, BooleanField, DateTimeField, IntField, ListField, ReferenceField
+from mongoengine import Document, StringField, EmailField, BooleanField, DateTimeField, IntField, FloatField, ListField, ReferenceField
 from datetime import datetime
+from backend.utils.principal_cache import principal_cache
 
 # ---------------------------------------------------------------------------
 # 📌 User Model
@@ -30,6 +31,18 @@ class User(Document):
 
     address = StringField(max_length=200)
     profile_picture_url = StringField()
+
+    # Open BorrowRecords, kept in step by borrow/return with atomic $inc
+    # (rebuild with: manage.py reconcile_active_loans)
+    active_loans = IntField(default=0)
+
+    # Bumped by revoke_user_tokens; stateless access tokens carry the version
+    # they were issued with (Redis holds a copy, re-seeded from here when missing)
+    token_version = IntField(default=0)
+
+    # Unpaid fines owed, = sum of this user's FineLedgerEntry amounts; kept in
+    # step by borrow.ledger with atomic $inc (rebuild with: manage.py reconcile_fine_balances)
+    fine_balance = FloatField(default=0.0)
     
     meta = {
         'indexes': [
@@ -40,5 +53,23 @@ class User(Document):
         ]
     }
     
+    # Every write through the model drops the cached principal, so the next
+    # request in this process sees the new role / profile. Raw collection
+    # writes ($inc on the counters) call principal_cache.invalidate themselves.
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        principal_cache.invalidate(self.id)
+        return result
+
+    def update(self, **kwargs):
+        result = super().update(**kwargs)
+        principal_cache.invalidate(self.id)
+        return result
+
+    def delete(self, *args, **kwargs):
+        user_id = self.id
+        super().delete(*args, **kwargs)
+        principal_cache.invalidate(user_id)
+
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -1,3 +1,73 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+from backend.utils.principal_cache import PrincipalCache
 
-# Create your tests here.
+
+class FakeUser:
+    """Stands in for a User document: to_mongo().to_dict() and _from_son()."""
+
+    def __init__(self, son):
+        self.son = son
+
+    def to_mongo(self):
+        return self
+
+    def to_dict(self):
+        return self.son
+
+    @classmethod
+    def _from_son(cls, son):
+        return cls(son)
+
+
+# -------------------------
+# Principal cache (backend/utils/principal_cache.py)
+# -------------------------
+class PrincipalCacheTests(SimpleTestCase):
+    def test_get_returns_a_fresh_copy(self):
+        cache = PrincipalCache(max_size=4, ttl=60)
+        user = FakeUser({"_id": 1, "username": "ana", "roles": ["member"]})
+        cache.set(1, user)
+        user.son["roles"].append("admin")  # the stored snapshot must not follow the original
+
+        first = cache.get(1)
+        first.son["roles"].append("librarian")
+        second = cache.get(1)
+
+        self.assertIsInstance(second, FakeUser)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.son["roles"], ["member"])
+
+    def test_keys_are_compared_as_strings(self):
+        cache = PrincipalCache(max_size=4, ttl=60)
+        cache.set(7, FakeUser({"_id": 7}))
+        self.assertEqual(cache.get("7").son, {"_id": 7})
+
+    def test_expired_entry_is_a_miss(self):
+        cache = PrincipalCache(max_size=4, ttl=-1)
+        cache.set(1, FakeUser({"_id": 1}))
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats()["size"], 0)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PrincipalCache(max_size=2, ttl=60)
+        cache.set(1, FakeUser({"_id": 1}))
+        cache.set(2, FakeUser({"_id": 2}))
+        cache.get(1)
+        cache.set(3, FakeUser({"_id": 3}))
+
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNotNone(cache.get(3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_invalidate_drops_the_entry(self):
+        cache = PrincipalCache(max_size=4, ttl=60)
+        cache.set(1, FakeUser({"_id": 1}))
+        cache.invalidate("1")
+        self.assertIsNone(cache.get(1))
+
+    def test_zero_size_disables_the_cache(self):
+        cache = PrincipalCache(max_size=0, ttl=60)
+        cache.set(1, FakeUser({"_id": 1}))
+        self.assertIsNone(cache.get(1))
@@ -2,10 +2,10 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.hashers import check_password, make_password
 from users.models import User
-from backend.utils.auth_utils import generate_access_token, generate_refresh_token, decode_token
+from backend.utils.auth_utils import generate_access_token, generate_refresh_token, decode_token, revoke_user_tokens
 from backend.utils.permissions import require_role
 from backend.utils.pagination import paginate
-from backend.utils.json_utils import to_dict, to_dict_list
+from backend.utils.json_utils import to_dict, to_dict_list, lean, raw_to_dict
 from backend.utils.redis_client import redis_client
 import json
 from mongoengine.queryset.visitor import Q
@@ -14,6 +14,10 @@ from datetime import datetime, timedelta
 from datetime import datetime, timedelta
 from books.models import Book, BookCopy
 from borrow.models import BorrowRecord
+from borrow.snapshots import queue_snapshot_sync
+from borrow.ledger import current_balance
+from borrow.archive import archived_count, with_archive
+from borrow.fines import DAY_MS
 from users.models import User
 # -------------------------
 # REGISTER USER
@@ -61,7 +65,7 @@ def login_user(request):
     if not user or not check_password(password, user.password_hash):
         return JsonResponse({"error": "Invalid credentials"}, status=401)
     print(user.id)
-    access_token = generate_access_token((user.id))
+    access_token = generate_access_token(user.id, role=user.role, username=user.username)
     refresh_token = generate_refresh_token((user.id))
 
     response = JsonResponse({
@@ -83,7 +87,9 @@ def get_profile(request):
     user = getattr(request, "user", None)
     if not user:
         return JsonResponse({"error": "Authentication required"}, status=401)
-    return JsonResponse({"user": to_dict(user)}, status=200)  # ✅ Wrapped in "user"
+    profile = to_dict(user)
+    profile["fine_balance"] = current_balance(user.id)  # the cached principal may predate a return or payment
+    return JsonResponse({"user": profile}, status=200)  # ✅ Wrapped in "user"
 
 
 # -------------------------
@@ -96,12 +102,21 @@ def update_profile(request):
         return JsonResponse({"error": "Authentication required"}, status=401)
 
     data = json.loads(request.body)
+    old_username, old_email = user.username, user.email
     if "password" in data:
         user.password_hash = make_password(data["password"])
     for field in ["username", "email", "full_name", "phone", "address", "profile_picture_url"]:
         if field in data:
             setattr(user, field, data[field])
     user.save()
+
+    # Keep the username / email snapshots on BorrowRecords in step
+    renamed = {}
+    if user.username != old_username:
+        renamed["username"] = user.username
+    if user.email != old_email:
+        renamed["user_email"] = user.email
+    queue_snapshot_sync("user", user.id, renamed)
     return JsonResponse({"message": "Profile updated successfully", "user": to_dict(user)}, status=200)
 
 
@@ -118,12 +133,18 @@ def logout_user(request):
 # -------------------------
 # GET ALL USERS (ADMIN)
 # -------------------------
+USER_LIST_FIELDS = (
+    "id", "username", "email", "full_name", "phone", "role", "is_active",
+    "created_at", "updated_at", "address", "profile_picture_url",
+)
+
 @require_role("admin","librarian")
 def get_all_users(request):
-    users = User.objects.all()
+    # Lean read: raw dicts with a projection (never loads password_hash)
+    users = [raw_to_dict(u) for u in lean(User.objects.all(), *USER_LIST_FIELDS)]
     return JsonResponse({
-        "count": users.count(),
-        "users": to_dict_list(users)
+        "count": len(users),
+        "users": users
     }, status=200)
 
 
@@ -141,12 +162,12 @@ def refresh_token_view(request):
     if not token:
         return JsonResponse({"error": "Refresh token is missing"}, status=400)
 
-    user_id = decode_token(token)
-    if not user_id:
+    user = decode_token(token)
+    if user is None:
         return JsonResponse({"error": "Invalid or expired refresh token"}, status=401)
 
     # Generate new access token
-    new_access_token = generate_access_token(str(user_id))
+    new_access_token = generate_access_token(user.id, role=user.role, username=user.username)
 
     response = JsonResponse({"message": "Access token refreshed"}, status=200)
     response.set_cookie(
@@ -232,6 +253,7 @@ def update_user_role(request, user_id):
 
     user.role = new_role
     user.save()
+    revoke_user_tokens(user.id)
 
     return JsonResponse({
         "message": f"Role updated successfully to '{new_role}'",
@@ -338,6 +360,7 @@ def delete_user(request, user_id):
         return JsonResponse({"error": "You cannot delete your own account."}, status=400)
 
     user.delete()
+    revoke_user_tokens(user.id)
     return JsonResponse({"message": f"User '{user.username}' deleted successfully."}, status=200)
 # library/utils.py or in your views
 
@@ -432,9 +455,10 @@ def dashboard_summary(request):
                 "available": available_copies
             })
 
-        # Borrows / transactions
+        # Borrows / transactions (all-time figures include the archive partitions,
+        # which only ever hold returned records)
         active_borrows = BorrowRecord.objects(returned=False).count()
-        total_transactions = BorrowRecord.objects.count()
+        total_transactions = BorrowRecord.objects.count() + archived_count()
         overdue = BorrowRecord.objects(returned=False, due_date__lt=today).count()
         status_distribution = {
             "active": active_borrows,
@@ -461,6 +485,7 @@ def dashboard_summary(request):
 
         # Top 5 borrowed books
         top_books_agg = BorrowRecord.objects.aggregate([
+            *with_archive(),
             {"$group": {"_id": "$book", "borrow_count": {"$sum": 1}}},
             {"$sort": {"borrow_count": -1}},
             {"$limit": 5}
@@ -474,13 +499,16 @@ def dashboard_summary(request):
             })
 
         # Average borrow duration
-        borrowed_records = BorrowRecord.objects(returned=True)
-        total_days, count_records = 0, 0
-        for br in borrowed_records:
-            if br.borrow_date and br.return_date:
-                total_days += (br.return_date - br.borrow_date).days
-                count_records += 1
-        avg_borrow_duration = (total_days / count_records) if count_records else 0
+        # (whole days per loan, as timedelta.days, averaged in one aggregation)
+        returned_match = {"returned": True, "borrow_date": {"$ne": None}, "return_date": {"$ne": None}}
+        durations = list(BorrowRecord._get_collection().aggregate([
+            {"$match": returned_match},
+            *with_archive(returned_match),
+            {"$group": {"_id": None, "avg_days": {"$avg": {
+                "$floor": {"$divide": [{"$subtract": ["$return_date", "$borrow_date"]}, DAY_MS]}
+            }}}},
+        ], allowDiskUse=True))
+        avg_borrow_duration = (durations[0]["avg_days"] or 0) if durations else 0
 
         response_data = {
             "total_users": total_users,